@@ -0,0 +1,566 @@
+# ---------------- BDIX Benchmark ----------------
+# Runs the probe engine against a local farm of stand-in HTTP and FTP servers
+# and reports how fast and how accurate the scan was, without touching the
+# network. Every stand-in host has its own loopback address, a bandwidth cap
+# per connection, a response latency and an optional slow start; dead hosts
+# either refuse connections or accept them and never answer. The farm and the
+# scan run in separate processes, so the CPU time and peak memory reported
+# belong to the scan alone. Each run is appended to a JSONL file and compared
+# with the last run of the same scenario, so regressions show up between
+# versions.
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import platform
+import threading
+import subprocess
+import multiprocessing
+from dataclasses import dataclass
+
+from bdix_monitor import percentile
+
+logger = logging.getLogger("BDIX Speed Test")
+
+BENCH_FILE = "bench_results.jsonl"
+FILE_SIZE = 1024 ** 3       # Bytes each stand-in file claims to have; data is generated on the fly
+PACE_INTERVAL = 0.002       # Seconds of data written at a time by a throttled connection
+SLOW_START_RATE = 0.25      # Share of the bandwidth used during a host's slow start
+FARM_NETWORK = (127, 0, 1)  # Stand-in hosts get 127.0.1.1, 127.0.1.2, ...
+DEAD_KINDS = ('hang', 'refused')  # Dead hosts alternate between these
+
+# Tolerances before a change counts as a regression: (metric, worse when, allowed change)
+REGRESSION_CHECKS = [
+    ('urls_per_s', 'lower', 0.10),
+    ('cpu_per_url_ms', 'higher', 0.15),
+    ('peak_mb', 'higher', 0.10),
+    ('speed_error_pct', 'higher', 5.0),   # Percentage points
+    ('missed', 'higher', 0),
+    ('false_ok', 'higher', 0),
+]
+
+SCENARIOS = {
+    'quick': {
+        'hosts': 20, 'urls_per_host': 5, 'bandwidth': [5, 10, 20, 50], 'latency': 20,
+        'slow_start': 0, 'dead': 2, 'ftp_hosts': 2, 'engine': {'probe_budget': 5},
+    },
+    'accuracy': {
+        'hosts': 8, 'urls_per_host': 3, 'bandwidth': [1, 2, 5, 10, 20, 50, 100, 200], 'latency': 5,
+        'slow_start': 0, 'dead': 0, 'ftp_hosts': 2, 'engine': {'sample_size': 1024 * 1024},
+    },
+    'slow-start': {
+        'hosts': 8, 'urls_per_host': 2, 'bandwidth': [5, 10, 20, 50], 'latency': 10,
+        'slow_start': 1.0, 'dead': 0, 'ftp_hosts': 0,
+        'engine': {'measure_window': 2, 'ramp_up': 1.5},
+    },
+    'scale': {
+        'hosts': 200, 'urls_per_host': 25, 'bandwidth': [100], 'latency': 10,
+        'slow_start': 0, 'dead': 20, 'ftp_hosts': 0,
+        'engine': {'sample_size': 65536, 'max_workers': 64, 'probe_budget': 3},
+    },
+}
+
+@dataclass
+class HostSpec:
+    kind: str               # 'http' or 'ftp'
+    bandwidth: float        # Mbps per connection
+    latency: float = 0      # Seconds before every response
+    slow_start: float = 0   # Seconds each transfer runs at SLOW_START_RATE
+    dead: str = ''          # '', 'hang' or 'refused'
+    address: str = ''
+    port: int = 0
+
+def build_hosts(config):
+    hosts = []
+    total = config['hosts'] + config['dead']
+    for number in range(total):
+        dead = DEAD_KINDS[(number - config['hosts']) % len(DEAD_KINDS)] if number >= config['hosts'] else ''
+        kind = 'ftp' if number < config['ftp_hosts'] else 'http'
+        bandwidth = config['bandwidth'][number % len(config['bandwidth'])]
+        hosts.append(HostSpec(kind, bandwidth, config['latency'] / 1000, config['slow_start'], dead))
+    return hosts
+
+def host_urls(host, count):
+    return [f"{host.kind}://{host.address}:{host.port}/file{number}.bin" for number in range(count)]
+
+# ---------------- Stand-in server farm ----------------
+
+ZEROS = bytes(1024 * 1024)
+
+def pace_chunk(rate):
+    return max(1460, min(len(ZEROS), int(rate * PACE_INTERVAL)))
+
+async def send_paced(writer, length, host):
+    # Writes `length` zero bytes at the host's bandwidth, slower during its slow start
+    loop = asyncio.get_running_loop()
+    rate = host.bandwidth * 1_000_000 / 8
+    slow_rate = rate * SLOW_START_RATE
+    slow_bytes = slow_rate * host.slow_start
+    chunk = pace_chunk(rate)
+    started = loop.time()
+    sent = 0
+    while sent < length:
+        size = min(chunk, length - sent)
+        writer.write(ZEROS[:size])
+        await writer.drain()
+        sent += size
+        if sent <= slow_bytes:
+            due = started + sent / slow_rate
+        else:
+            due = started + host.slow_start + (sent - slow_bytes) / rate
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+async def serve_http(host, reader, writer):
+    try:
+        while True:
+            request = await reader.readuntil(b'\r\n\r\n')
+            lines = request.decode('latin-1').split('\r\n')
+            method = lines[0].split(' ', 1)[0]
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            start, end, status = 0, FILE_SIZE - 1, '200 OK'
+            requested = headers.get('range', '')
+            if requested.startswith('bytes='):
+                first, _, last = requested[6:].partition('-')
+                start = int(first or 0)
+                end = min(int(last), end) if last else end
+                status = '206 Partial Content'
+            head = [f'HTTP/1.1 {status}', 'Content-Type: application/octet-stream',
+                    f'Content-Length: {end - start + 1}', 'Accept-Ranges: bytes']
+            if status.startswith('206'):
+                head.append(f'Content-Range: bytes {start}-{end}/{FILE_SIZE}')
+
+            await asyncio.sleep(host.latency)
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+            if method == 'HEAD':
+                await writer.drain()
+            else:
+                await send_paced(writer, end - start + 1, host)
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+async def serve_ftp(host, reader, writer):
+    # Just enough of RFC 959 for ftplib: login, SIZE, PASV/EPSV and RETR
+    data = {}
+
+    async def reply(text):
+        writer.write((text + '\r\n').encode('latin-1'))
+        await writer.drain()
+
+    def on_data(data_reader, data_writer):
+        if not data['connected'].done():
+            data['connected'].set_result(data_writer)
+
+    try:
+        await asyncio.sleep(host.latency)
+        await reply('220 BDIX benchmark FTP')
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command, _, argument = line.decode('latin-1').strip().partition(' ')
+            command = command.upper()
+            if command == 'USER':
+                await reply('331 Password required')
+            elif command == 'PASS':
+                await reply('230 Logged in')
+            elif command in ('TYPE', 'NOOP', 'MODE', 'STRU'):
+                await reply('200 OK')
+            elif command == 'SIZE':
+                await reply(f'213 {FILE_SIZE}')
+            elif command == 'REST':
+                data['rest'] = int(argument or 0)
+                await reply('350 Restarting')
+            elif command in ('PASV', 'EPSV'):
+                if 'server' in data:
+                    data['server'].close()
+                data['connected'] = asyncio.get_running_loop().create_future()
+                data['server'] = await asyncio.start_server(on_data, host.address, 0)
+                port = data['server'].sockets[0].getsockname()[1]
+                if command == 'EPSV':
+                    await reply(f'229 Entering Extended Passive Mode (|||{port}|)')
+                else:
+                    numbers = host.address.replace('.', ',')
+                    await reply(f'227 Entering Passive Mode ({numbers},{port >> 8},{port & 0xFF})')
+            elif command == 'RETR':
+                if 'server' not in data:
+                    await reply('425 Use PASV first')
+                    continue
+                await reply('150 Opening data connection')
+                data_writer = await asyncio.wait_for(data['connected'], 10)
+                data['server'].close()
+                del data['server']
+                await asyncio.sleep(host.latency)
+                try:
+                    await send_paced(data_writer, FILE_SIZE - data.pop('rest', 0), host)
+                    data_writer.close()
+                    await reply('226 Transfer complete')
+                except ConnectionError:
+                    data_writer.close()
+                    await reply('426 Connection closed; transfer aborted')
+            elif command == 'QUIT':
+                await reply('221 Bye')
+                break
+            else:
+                await reply('502 Command not implemented')
+    except (ConnectionError, asyncio.TimeoutError, ValueError):
+        pass
+    finally:
+        if 'server' in data:
+            data['server'].close()
+        writer.close()
+
+async def serve_dead(reader, writer):
+    # Accepts the connection and never answers
+    try:
+        while await reader.read(65536):
+            pass
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+def bind_address(number):
+    # Own loopback address per host where the OS allows it (Linux, Windows), else 127.0.0.1
+    address = '.'.join(map(str, FARM_NETWORK + (number + 1,)))
+    try:
+        with socket.socket() as probe:
+            probe.bind((address, 0))
+        return address
+    except OSError:
+        return '127.0.0.1'
+
+async def run_farm_async(hosts, conn):
+    servers = []
+    refused = []
+    for number, host in enumerate(hosts):
+        host.address = bind_address(number)
+        if host.dead == 'refused':
+            # A port that was just free and has nothing listening on it
+            sock = socket.socket()
+            sock.bind((host.address, 0))
+            host.port = sock.getsockname()[1]
+            refused.append(sock)
+            continue
+        if host.dead == 'hang':
+            handler = serve_dead
+        else:
+            serve = serve_ftp if host.kind == 'ftp' else serve_http
+            handler = (lambda serve, host: lambda reader, writer: serve(host, reader, writer))(serve, host)
+        server = await asyncio.start_server(handler, host.address, 0, backlog=1024)
+        host.port = server.sockets[0].getsockname()[1]
+        servers.append(server)
+    for sock in refused:
+        sock.close()
+
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def wait_for_stop():
+        try:
+            conn.recv()
+        except EOFError:
+            pass
+        loop.call_soon_threadsafe(stopped.set)
+
+    conn.send([(host.address, host.port) for host in hosts])
+    threading.Thread(target=wait_for_stop, daemon=True).start()
+    await stopped.wait()
+    for server in servers:
+        server.close()
+
+def run_farm(hosts, conn):
+    try:
+        asyncio.run(run_farm_async(hosts, conn))
+    finally:
+        conn.close()
+
+class Farm:
+    # The stand-in servers, running in their own process
+    def __init__(self, hosts):
+        self.hosts = hosts
+        self.process = None
+        self.conn = None
+
+    def __enter__(self):
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=run_farm, args=(self.hosts, child_conn), daemon=True,
+                                       name="bdix-bench-farm")
+        self.process.start()
+        child_conn.close()
+        for host, (address, port) in zip(self.hosts, self.conn.recv()):
+            host.address, host.port = address, port
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self.conn.send('stop')
+        except OSError:
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+# ---------------- Scan under measurement ----------------
+
+def peak_memory_mb(who='self'):
+    # Peak resident memory, -1 where the platform does not report it
+    try:
+        import resource
+    except ImportError:
+        return -1
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN)
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def child_cpu_seconds():
+    try:
+        import resource
+    except ImportError:
+        return 0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def run_scan(urls, settings, shards):
+    # Runs in a fresh process so the CPU time and peak memory belong to this scan alone
+    from bdix_engine import SpeedTestEngine
+    from bdix_shard import ShardedScan
+    logging.basicConfig(level=logging.ERROR, format='%(levelname)s: %(message)s')
+
+    results = []
+    first_result = []
+    started = time.perf_counter()
+
+    def on_result(result):
+        if not first_result:
+            first_result.append(time.perf_counter() - started)
+        results.append(result.as_dict())
+
+    cpu = time.process_time()
+    if shards:
+        scanner = ShardedScan(shards=shards, on_result=on_result, **settings)
+    else:
+        scanner = SpeedTestEngine(on_result=on_result, **settings)
+    scanner.run(urls)
+    wall = time.perf_counter() - started
+    return {
+        'wall': wall,
+        'cpu': time.process_time() - cpu + child_cpu_seconds(),
+        'peak_mb': max(peak_memory_mb(), peak_memory_mb('children')),
+        'first_result': first_result[0] if first_result else -1,
+        'results': results,
+    }
+
+def scan_process(conn, urls, settings, shards):
+    try:
+        conn.send(run_scan(urls, settings, shards))
+    finally:
+        conn.close()
+
+def score(hosts, urls_per_host, scan):
+    # Compares every result with what its stand-in host was configured to deliver
+    expected = {}
+    for host in hosts:
+        for url in host_urls(host, urls_per_host):
+            expected[url] = host
+    errors, overheads = [], []
+    missed = false_ok = 0
+    for result in scan['results']:
+        host = expected.get(result['url'])
+        if host is None or result['skipped']:
+            continue
+        ok = result['ttfb'] >= 0 and result['speed'] > 0
+        if host.dead:
+            false_ok += ok
+            continue
+        if not ok:
+            missed += 1
+            continue
+        errors.append((result['speed'] / host.bandwidth - 1) * 100)
+        overheads.append(result['ttfb'] - host.latency * 1000)
+
+    count = len(expected)
+    return {
+        'urls': count,
+        'results': len(scan['results']),
+        'wall_s': round(scan['wall'], 3),
+        'urls_per_s': round(count / scan['wall'], 2) if scan['wall'] > 0 else -1,
+        'first_result_s': round(scan['first_result'], 3),
+        'cpu_s': round(scan['cpu'], 3),
+        'cpu_per_url_ms': round(scan['cpu'] * 1000 / count, 3) if count else -1,
+        'peak_mb': round(scan['peak_mb'], 1),
+        'speed_error_pct': round(sum(map(abs, errors)) / len(errors), 2) if errors else -1,
+        'speed_error_p95_pct': round(percentile([abs(error) for error in errors], 95), 2),
+        'speed_bias_pct': round(sum(errors) / len(errors), 2) if errors else -1,
+        'ttfb_overhead_ms': round(percentile(overheads, 50), 2),
+        'missed': missed,
+        'false_ok': false_ok,
+    }
+
+def run_scenario(config, shards=0):
+    hosts = build_hosts(config)
+    with Farm(hosts):
+        urls = [url for host in hosts for url in host_urls(host, config['urls_per_host'])]
+        context = multiprocessing.get_context('spawn')
+        conn, child_conn = context.Pipe(duplex=False)
+        # Not a daemon, so a sharded scan can start its own worker processes
+        process = context.Process(target=scan_process, args=(child_conn, urls, config.get('engine', {}), shards),
+                                  name="bdix-bench-scan")
+        process.start()
+        child_conn.close()
+        try:
+            scan = conn.recv()
+        except EOFError:
+            raise RuntimeError("Benchmark scan process exited without a result") from None
+        finally:
+            process.join()
+            conn.close()
+    return score(hosts, config['urls_per_host'], scan)
+
+def median_report(reports):
+    # Middle value of every metric over repeated runs
+    report = {}
+    for key, value in reports[0].items():
+        middle = percentile([run[key] for run in reports], 50)
+        report[key] = round(middle) if isinstance(value, int) else round(middle, 3)
+    return report
+
+# ---------------- Saved results ----------------
+
+def code_version():
+    try:
+        output = subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return output.stdout.strip() or 'unknown'
+    except (OSError, subprocess.SubprocessError):
+        return 'unknown'
+
+def load_runs(path):
+    runs = []
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    runs.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return runs
+
+def previous_run(runs, name, config):
+    for run in reversed(runs):
+        if run.get('scenario') == name and run.get('config') == config:
+            return run
+    return None
+
+def regressions(report, baseline):
+    found = []
+    for metric, worse, allowed in REGRESSION_CHECKS:
+        old, new = baseline.get(metric, -1), report.get(metric, -1)
+        if old < 0 or new < 0:
+            continue
+        change = new - old if metric.endswith('_pct') or allowed == 0 else (new - old) / old if old else 0
+        if (change < -allowed) if worse == 'lower' else (change > allowed):
+            found.append(f"{metric}: {old} -> {new}")
+    return found
+
+def print_report(name, report, baseline):
+    print(f"\n== {name} ==")
+    for key, value in report.items():
+        line = f"  {key:<22}{value}"
+        if baseline and key in baseline['report']:
+            line += f"  (was {baseline['report'][key]} in {baseline['version']})"
+        print(line)
+
+def apply_overrides(config, args):
+    config = json.loads(json.dumps(config))
+    for key in ('hosts', 'urls_per_host', 'latency', 'slow_start', 'dead', 'ftp_hosts'):
+        value = getattr(args, key)
+        if value is not None:
+            config[key] = value
+    if args.bandwidth:
+        config['bandwidth'] = [float(value) for value in args.bandwidth.split(',')]
+    engine = config.setdefault('engine', {})
+    for key, value in (('max_workers', args.workers), ('sample_size', args.sample_size),
+                       ('measure_window', args.window)):
+        if value is not None:
+            engine[key] = value
+    config['hosts'] = max(1, config['hosts'])
+    config['ftp_hosts'] = min(config['ftp_hosts'], config['hosts'])
+    return config
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="BDIX Speed Test - benchmark against a local server farm")
+    parser.add_argument('scenarios', nargs='*', default=['quick'],
+                        help=f"Scenarios to run: {', '.join(SCENARIOS)} (default: quick)")
+    parser.add_argument('--list', action='store_true', help="Show the scenarios and exit")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per scenario; the median is reported")
+    parser.add_argument('--shards', type=int, default=0, help="Scan with this many worker processes")
+    parser.add_argument('--results', default=BENCH_FILE, help="JSONL file runs are appended to and compared with")
+    parser.add_argument('--no-save', action='store_true', help="Compare with saved runs but do not append")
+    parser.add_argument('--label', help="Name saved with the runs instead of the git version")
+    parser.add_argument('--check', action='store_true', help="Exit with status 1 when a regression is found")
+    group = parser.add_argument_group("scenario overrides")
+    group.add_argument('--hosts', type=int, help="Live stand-in hosts")
+    group.add_argument('--urls-per-host', type=int, help="URLs scanned on every host")
+    group.add_argument('--bandwidth', help="Comma separated Mbps caps, assigned to the hosts in turn")
+    group.add_argument('--latency', type=float, help="Milliseconds before every response")
+    group.add_argument('--slow-start', type=float, help="Seconds each transfer starts at reduced speed")
+    group.add_argument('--dead', type=int, help="Extra hosts that hang or refuse connections")
+    group.add_argument('--ftp-hosts', type=int, help="How many of the live hosts serve FTP")
+    group.add_argument('--workers', type=int, help="Engine max_workers")
+    group.add_argument('--sample-size', type=int, help="Engine sample_size")
+    group.add_argument('--window', type=float, help="Engine measure_window")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.list:
+        for name, config in SCENARIOS.items():
+            print(f"{name}: {json.dumps(config)}")
+        return 0
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        print(f"Unknown scenario: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    runs = load_runs(args.results)
+    version = args.label or code_version()
+    failed = False
+    for name in args.scenarios:
+        config = apply_overrides(SCENARIOS[name], args)
+        config['shards'] = args.shards
+        reports = [run_scenario(config, args.shards) for _ in range(max(1, args.repeat))]
+        report = median_report(reports)
+        baseline = previous_run(runs, name, config)
+        print_report(name, report, baseline)
+        if baseline:
+            found = regressions(report, baseline['report'])
+            for item in found:
+                print(f"  REGRESSION {item}")
+            failed |= bool(found)
+
+        entry = {'time': time.time(), 'version': version, 'python': platform.python_version(),
+                 'platform': platform.platform(), 'cpus': os.cpu_count(), 'scenario': name,
+                 'config': config, 'repeat': max(1, args.repeat), 'report': report}
+        runs.append(entry)
+        if not args.no_save:
+            with open(args.results, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(entry) + '\n')
+    return 1 if failed and args.check else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+# ---------------- BDIX Probe Cancellation ----------------
+# Every socket a probe opens is registered here with the deadline of the probe
+# using it. Stopping a scan shuts all of them down, and the engine's tick shuts
+# down those whose probe has run out of time, so a thread blocked in recv()
+# wakes up at once instead of after its socket timeout.
+import time
+import socket
+import threading
+import weakref
+
+PROBE_BUDGET = 15.0  # Seconds one probe may spend connecting, requesting and downloading
+
+class ProbeTimeout(socket.timeout):
+    pass
+
+class ProbeSockets:
+    def __init__(self):
+        self._sockets = weakref.WeakKeyDictionary()  # socket -> deadline, None while idle in a pool
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.aborted = False
+
+    def begin(self, deadline):
+        # Start a probe on this thread; sockets it opens or reuses get its deadline
+        self._local.deadline = deadline
+        self._local.sockets = []
+
+    def set_deadline(self, deadline):
+        self._local.deadline = deadline
+
+    def end(self):
+        # Sockets left open (keep-alive, idle FTP sessions) no longer expire
+        with self._lock:
+            for sock in getattr(self._local, 'sockets', ()):
+                if sock in self._sockets:
+                    self._sockets[sock] = None
+        self._local.deadline = None
+        self._local.sockets = []
+
+    def deadline(self):
+        return getattr(self._local, 'deadline', None)
+
+    def expired(self):
+        deadline = self.deadline()
+        return deadline is not None and time.monotonic() >= deadline
+
+    def remaining(self, default=None):
+        # Seconds left for the probe on this thread, for use as a socket timeout
+        deadline = self.deadline()
+        if deadline is None:
+            return default
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise ProbeTimeout("Probe deadline exceeded")
+        return min(default, remaining) if default else remaining
+
+    def add(self, sock):
+        if sock is None:
+            return
+        if self.aborted:
+            # Connected after the scan was stopped
+            shutdown(sock)
+            return
+        with self._lock:
+            self._sockets[sock] = self.deadline()
+        sockets = getattr(self._local, 'sockets', None)
+        if sockets is not None:
+            sockets.append(sock)
+
+    def abort(self, expired_only=False):
+        now = time.monotonic()
+        with self._lock:
+            if not expired_only:
+                self.aborted = True
+            targets = [sock for sock, deadline in self._sockets.items()
+                       if not expired_only or (deadline is not None and deadline <= now)]
+            for sock in targets:
+                del self._sockets[sock]
+        for sock in targets:
+            shutdown(sock)
+        return len(targets)
+
+def shutdown(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
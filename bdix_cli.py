@@ -0,0 +1,261 @@
+# ---------------- BDIX Speed Test CLI ----------------
+# Headless scanner: reads URLs from a file and streams one result per line to
+# stdout as JSONL or CSV. Never imports PyQt5 or openpyxl, so it starts fast
+# and runs on boxes without a display (cron, servers, CI).
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+import bdix_engine
+from bdix_engine import SpeedTestEngine, NegativeCache
+from bdix_export import STREAM_WRITERS, RANKING_HEADERS, export_results, export_format
+from bdix_history import ResultHistory, HISTORY_TTL, RANKING_WINDOW
+from bdix_monitor import Monitor, MONITOR_INTERVAL
+from bdix_shard import ShardedScan, NODE_KEY
+from bdix_cancel import PROBE_BUDGET
+from bdix_metrics import ScanMetrics, write_metrics
+from bdix_logging import setup_logging
+from bdix_ingest import URLIngest
+
+logger = logging.getLogger("BDIX Speed Test")
+
+def make_writer(fmt, out):
+    writer = STREAM_WRITERS[fmt](out)
+
+    def write(result):
+        writer.write(result)
+        out.flush()
+    return write
+
+def write_status(path, monitor):
+    # Written to a temporary file first so readers never see half a snapshot
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump({'updated_at': time.time(), 'hosts': monitor.snapshot()}, file, indent=1)
+    os.replace(tmp_path, path)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="BDIX Speed Test - headless scanner")
+    parser.add_argument('url_files', nargs='+', metavar='url_file',
+                        help="Text files or directories with one URL per line ('-' for stdin)")
+    parser.add_argument('-f', '--format', choices=['jsonl', 'csv'], default='jsonl',
+                        help="Output format written to stdout (default: jsonl)")
+    parser.add_argument('-w', '--workers', type=int, default=bdix_engine.MAX_WORKERS,
+                        help="Probes running at the same time")
+    parser.add_argument('--per-host', type=int, default=bdix_engine.MAX_PER_HOST,
+                        help="Probes running at the same time against one host")
+    parser.add_argument('--sample-size', type=int, default=bdix_engine.SAMPLE_SIZE,
+                        help="Bytes downloaded per speed test")
+    parser.add_argument('--chunk-size', type=int, default=bdix_engine.CHUNK_SIZE,
+                        help="Bytes read from the socket per iteration")
+    parser.add_argument('--window', type=float, default=bdix_engine.MEASURE_WINDOW,
+                        help="Measure for this many seconds after ramp-up instead of a "
+                             "fixed --sample-size download (0 disables)")
+    parser.add_argument('--ramp-up', type=float, default=bdix_engine.RAMP_UP,
+                        help="Seconds after the first byte left out of the sustained rate")
+    parser.add_argument('--streams', type=int, default=bdix_engine.STREAMS,
+                        help="Parallel connections per URL in --window mode")
+    parser.add_argument('--budget', type=float, default=PROBE_BUDGET,
+                        help="Seconds one probe may spend connecting, requesting and downloading "
+                             "(--window and --ramp-up are added on top)")
+    parser.add_argument('--screen-timeout', type=float, default=bdix_engine.SCREEN_TIMEOUT,
+                        help="Seconds a host gets to accept a TCP connection before it is "
+                             "skipped (0 disables screening)")
+    parser.add_argument('--top-k', type=int, default=bdix_engine.TOP_K,
+                        help="Only measure the K fastest reachable hosts (0 means all)")
+    parser.add_argument('--range', action='store_true',
+                        help="Download a window of a large file found on each HTTP host with "
+                             "Range requests instead of the URL itself")
+    parser.add_argument('--shards', type=int, default=0,
+                        help="Split the scan over this many worker processes (0 scans in this process); "
+                             "--workers is divided between them")
+    parser.add_argument('--node', action='append', default=[], metavar='HOST:PORT',
+                        help="Also run a shard on a node started with 'python bdix_shard.py HOST:PORT' "
+                             "(repeatable)")
+    parser.add_argument('--node-key', default=NODE_KEY,
+                        help="Shared secret for --node connections, required with --node (default: $BDIX_NODE_KEY)")
+    parser.add_argument('--history', metavar='DB',
+                        help="Record results in this SQLite history database")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only test URLs that are new, failed last time or older than --ttl "
+                             "(requires --history)")
+    parser.add_argument('--ttl', type=float, default=HISTORY_TTL,
+                        help="Seconds before a cached result is re-tested (default: %(default)s)")
+    parser.add_argument('--monitor', action='store_true',
+                        help="Keep running and re-probe hosts on a schedule until interrupted")
+    parser.add_argument('--interval', type=float, default=MONITOR_INTERVAL,
+                        help="Seconds between re-probes of an ordinary host in --monitor mode; "
+                             "volatile and fast hosts are re-probed more often")
+    parser.add_argument('--status-file', metavar='JSON',
+                        help="In --monitor mode, keep per-host p50/p95 statistics in this file")
+    parser.add_argument('--rank', metavar='PATH',
+                        help="Write a ranking of the URLs to this .csv, .jsonl or .xlsx file, aggregating "
+                             "every run in the history from the last --rank-window seconds")
+    parser.add_argument('--rank-window', type=float, default=RANKING_WINDOW,
+                        help="Seconds of past runs included in --rank (default: %(default)s)")
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="Write per-phase timing histograms, bytes and error counts to this file "
+                             "(JSON for *.json, Prometheus text format otherwise)")
+    parser.add_argument('--log-level', default='WARNING',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+                        help="Log level for messages written to stderr (and --log-file)")
+    parser.add_argument('--log-file', metavar='PATH',
+                        help="Also write the log to this file, rotated by size")
+    parser.add_argument('--events', metavar='JSONL',
+                        help="Write every probe result and timing to this file as JSON lines")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging(args.log_level, log_file=args.log_file, console_level=logging.NOTSET,
+                  event_file=args.events)
+
+    if args.rank and not export_format(args.rank):
+        logger.error(f"Unsupported ranking format: {args.rank}")
+        return 2
+    missing = [path for path in args.url_files if path != '-' and not os.path.exists(path)]
+    if missing:
+        logger.error(f"Failed to read file: {', '.join(missing)} not found")
+        return 2
+    # URLs are read lazily while the first ones are already being probed
+    ingest = URLIngest(args.url_files)
+    urls, overrides = ingest, ingest.overrides
+
+    history = ResultHistory(args.history) if args.history else None
+    if args.incremental:
+        if not history:
+            logger.error("--incremental requires --history")
+            return 2
+        urls = history.iter_stale(urls, args.ttl)
+
+    write = make_writer(args.format, sys.stdout)
+    ranking = None
+    if args.rank:
+        # NumPy is only loaded when a ranking is asked for
+        from bdix_store import ResultStore
+        ranking = ResultStore()
+
+    def on_result(result):
+        write(result)
+        if history:
+            history.record([result])
+        if ranking is not None:
+            ranking.add([result])
+
+    negative_cache = NegativeCache(history.load_backoff() if history else None)
+    probe_objects = history.load_probe_objects() if history else None
+    metrics = ScanMetrics()
+    sharded = args.shards > 0 or args.node
+    if args.node and not args.node_key:
+        logger.error("--node requires a shared node key (--node-key or BDIX_NODE_KEY)")
+        return 2
+    if args.monitor:
+        if sharded:
+            logger.error("--shards and --node cannot be combined with --monitor")
+            return 2
+        urls = list(urls)
+        if not urls:
+            logger.warning("No valid URLs found in the file")
+            return 1
+        return run_monitor(args, urls, overrides, on_result, history, negative_cache, probe_objects, metrics,
+                           ranking)
+
+    settings = dict(on_result=on_result,
+                    max_workers=args.workers, max_per_host=args.per_host,
+                    sample_size=args.sample_size, chunk_size=args.chunk_size,
+                    measure_window=args.window, ramp_up=args.ramp_up,
+                    streams=args.streams,
+                    screen_timeout=args.screen_timeout, top_k=args.top_k,
+                    negative_cache=negative_cache, range_probe=args.range,
+                    probe_budget=args.budget, metrics=metrics,
+                    probe_objects=probe_objects)
+    if sharded:
+        engine = ShardedScan(shards=args.shards, nodes=args.node, authkey=args.node_key, **settings)
+    else:
+        engine = SpeedTestEngine(**settings)
+    try:
+        engine.run(urls, overrides)
+    except KeyboardInterrupt:
+        engine.stop()
+        return 130
+    except RuntimeError as e:
+        # The sharded scan could not start or lost every shard
+        logger.error(str(e))
+        return 2
+    finally:
+        if ranking is not None:
+            save_ranking(args.rank, ranking, history, args.rank_window)
+        if history:
+            history.save_backoff(negative_cache.entries)
+            history.save_probe_objects(engine.probe_objects)
+            history.close()
+        if args.metrics:
+            save_metrics(args.metrics, metrics)
+    if not ingest.accepted:
+        logger.warning("No valid URLs found in the file")
+        return 1
+    return 0
+
+def save_metrics(path, metrics):
+    try:
+        write_metrics(metrics, path)
+    except OSError as e:
+        logger.error(f"Failed to write metrics: {e}")
+
+def save_ranking(path, ranking, history=None, window=RANKING_WINDOW):
+    from bdix_store import RANKING_FIELDS
+    if history:
+        # Every run within the window counts, not only the ones from this scan
+        urls = list(ranking.urls)
+        ranking.clear()
+        ranking.add(history.iter_samples(urls, time.time() - window))
+    else:
+        # Without a history the store holds the runs itself; older ones are dropped so
+        # memory stays bounded in --monitor mode
+        ranking.drop_before(time.time() - window)
+    ranking.aggregate()
+    try:
+        export_results(ranking, path, fields=RANKING_FIELDS, headers=RANKING_HEADERS)
+    except OSError as e:
+        logger.error(f"Failed to write ranking: {e}")
+
+def run_monitor(args, urls, overrides, on_result, history, negative_cache, probe_objects, metrics,
+                ranking=None):
+    def on_round(monitor):
+        if args.metrics:
+            save_metrics(args.metrics, metrics)
+        if ranking is not None:
+            save_ranking(args.rank, ranking, history, args.rank_window)
+        if args.status_file:
+            try:
+                write_status(args.status_file, monitor)
+            except OSError as e:
+                logger.error(f"Failed to write status file: {e}")
+        if history:
+            history.save_backoff(negative_cache.entries)
+            history.save_probe_objects(monitor.probe_objects)
+
+    monitor = Monitor(urls, overrides, interval=args.interval, on_result=on_result, on_round=on_round,
+                      negative_cache=negative_cache, probe_objects=probe_objects, metrics=metrics,
+                      max_workers=args.workers, max_per_host=args.per_host,
+                      sample_size=args.sample_size, chunk_size=args.chunk_size,
+                      measure_window=args.window, ramp_up=args.ramp_up, streams=args.streams,
+                      screen_timeout=args.screen_timeout, top_k=args.top_k, range_probe=args.range,
+                      probe_budget=args.budget)
+    try:
+        monitor.run()
+    except KeyboardInterrupt:
+        monitor.stop()
+        return 130
+    finally:
+        if history:
+            history.save_backoff(negative_cache.entries)
+            history.save_probe_objects(monitor.probe_objects)
+            history.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
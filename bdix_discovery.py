@@ -0,0 +1,100 @@
+# ---------------- BDIX Probe Object Discovery ----------------
+# Finds a large downloadable file on an HTTP server so throughput tests fetch
+# the same kind of object everywhere instead of whatever the index page is.
+# Index pages (and one or two levels of directory listings below them) are
+# scanned for links to large files, which are then sized with HEAD requests.
+import logging
+from collections import deque
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit, unquote
+
+logger = logging.getLogger("BDIX Speed Test")
+
+LARGE_FILE_EXTENSIONS = ('.mkv', '.mp4', '.avi', '.mov', '.m4v', '.ts', '.webm', '.iso', '.img',
+                         '.zip', '.rar', '.7z', '.tar', '.gz', '.xz', '.bin', '.exe', '.msi', '.apk')
+DISCOVERY_PAGE_BYTES = 256 * 1024    # Bytes of each index page that are parsed
+DISCOVERY_MAX_PAGES = 5              # Index pages fetched per host
+DISCOVERY_MAX_HEADS = 10             # HEAD requests per host
+MIN_OBJECT_SIZE = 10 * 1024 * 1024   # A file this large ends the search
+
+class LinkParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            for name, value in attrs:
+                if name == 'href' and value:
+                    self.links.append(value)
+
+def read_page(session, url, timeout):
+    response = session.get(url, stream=True, timeout=timeout)
+    try:
+        if response.status_code != 200 or 'html' not in response.headers.get('Content-Type', ''):
+            return None
+        body = response.raw.read(DISCOVERY_PAGE_BYTES, decode_content=True)
+        return body.decode(response.encoding or 'utf-8', errors='replace')
+    finally:
+        response.close()
+
+def object_size(session, url, timeout):
+    response = session.head(url, timeout=timeout, allow_redirects=True)
+    response.close()
+    if response.status_code != 200:
+        return 0
+    return int(response.headers.get('Content-Length', 0) or 0)
+
+def discover_object(session, url, timeout=10):
+    # (object URL, size) of the largest file found below url, or None
+    origin = urlsplit(url)
+    pages = deque([url])
+    seen = {url}
+    heads = 0
+    pages_read = 0
+    best = None
+
+    while pages and pages_read < DISCOVERY_MAX_PAGES and heads < DISCOVERY_MAX_HEADS:
+        page = pages.popleft()
+        pages_read += 1
+        try:
+            html = read_page(session, page, timeout)
+        except Exception as e:
+            logger.debug("Discovery could not read %s: %s", page, e)
+            continue
+        if not html:
+            continue
+
+        parser = LinkParser()
+        parser.feed(html)
+        files = []
+        for link in parser.links:
+            target = urljoin(page, link).split('#')[0]
+            parts = urlsplit(target)
+            # Stay on the same server and below the page we started from
+            if parts.netloc != origin.netloc or target in seen or not target.startswith(url.rsplit('/', 1)[0]):
+                continue
+            seen.add(target)
+            path = unquote(parts.path).lower()
+            if path.endswith(LARGE_FILE_EXTENSIONS):
+                files.append(target)
+            elif path.endswith('/') and not parts.query:
+                pages.append(target)
+
+        for target in files:
+            if heads >= DISCOVERY_MAX_HEADS:
+                break
+            heads += 1
+            try:
+                size = object_size(session, target, timeout)
+            except Exception as e:
+                logger.debug("Discovery could not size %s: %s", target, e)
+                continue
+            if size and (best is None or size > best[1]):
+                best = (target, size)
+        if best and best[1] >= MIN_OBJECT_SIZE:
+            break
+
+    if best:
+        logger.debug("Probe object for %s: %s (%d bytes)", origin.netloc, best[0], best[1])
+    return best
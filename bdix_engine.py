@@ -0,0 +1,936 @@
+# ---------------- BDIX Speed Test Engine ----------------
+# Probing logic shared by the GUI and the command line. This module must stay
+# importable without PyQt5 or openpyxl; requests is only imported once a scan
+# actually needs it.
+import time
+import ftplib
+import socket
+import ipaddress
+import threading
+import logging
+from queue import Queue, Empty, Full
+from collections import defaultdict, deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, asdict, replace
+from urllib.parse import urlsplit, urlunsplit
+
+from bdix_ping import PingSweep, PING_COUNT, PING_TIMEOUT
+from bdix_ftp import FTPProbe
+from bdix_throughput import ThroughputMeter
+from bdix_discovery import discover_object
+from bdix_cancel import ProbeSockets, PROBE_BUDGET
+from bdix_metrics import ScanMetrics, ProbeTiming
+from bdix_logging import log_event
+
+logger = logging.getLogger("BDIX Speed Test")
+
+# ---------------- Concurrency Settings ----------------
+MAX_WORKERS = 32      # Probes running at the same time across all hosts
+MAX_PER_HOST = 4      # Probes running at the same time against a single host
+TICK_INTERVAL = 0.1   # Seconds between checks for stop requests and expired probes
+INGEST_BATCH = 500    # URLs pulled at a time from a lazy source
+FEED_BUFFER = 2 * INGEST_BATCH  # URLs a reader thread may hold ahead of the scheduler
+
+# ---------------- Download Sample Settings ----------------
+SAMPLE_SIZE = 102400  # Bytes downloaded per speed test (100KB)
+CHUNK_SIZE = 8192     # Bytes read from the socket per iteration
+
+# ---------------- Throughput Window Settings ----------------
+MEASURE_WINDOW = 0    # Seconds measured after ramp-up (0 keeps the fixed SAMPLE_SIZE sample)
+RAMP_UP = 1.0         # Seconds after the first byte left out of the sustained rate
+STREAMS = 1           # Parallel connections opened to the same URL
+PEAK_INTERVAL = 0.25  # Seconds per slice when looking for the peak rate
+
+# ---------------- Connection Pool Settings ----------------
+POOL_CONNECTIONS = 64         # Hosts whose connection pools are kept alive
+POOL_MAXSIZE = MAX_PER_HOST   # Keep-alive connections kept per host
+DNS_CACHE_TTL = 300           # Seconds a resolved address is reused
+
+# ---------------- Screening Settings ----------------
+SCREEN_TIMEOUT = 1.0      # Seconds a host gets to accept a TCP connection (0 disables screening)
+TOP_K = 0                 # Only measure the K fastest reachable hosts (0 means all)
+BACKOFF_BASE = 60         # Seconds a host is skipped after its first failed screening
+BACKOFF_MAX = 24 * 3600   # Upper limit for the doubling backoff
+
+# ---------------- Range Probe Settings ----------------
+RANGE_PROBE = False   # Measure a large file found on each HTTP host instead of the URL itself
+RANGE_OFFSET = 0      # First byte of the window requested with a Range header
+
+@dataclass
+class ProbeResult:
+    url: str
+    ping: float = -1       # ms, average RTT, -1 when the host did not answer
+    jitter: float = -1     # ms, mean difference between consecutive RTTs
+    loss: float = 100      # percent of echoes that got no reply
+    speed: float = 0       # Mbps, steady-state throughput
+    ttfb: float = -1       # ms, -1 when no byte arrived
+    reused: bool = False   # True when the connection came from the pool
+    peak: float = 0        # Mbps, best PEAK_INTERVAL slice of the measurement
+    skipped: str = ''      # 'backoff' or 'top_k' when the URL was not probed this run
+
+    def as_dict(self):
+        return asdict(self)
+
+RESULT_FIELDS = ['url', 'ping', 'jitter', 'loss', 'speed', 'peak', 'ttfb', 'reused', 'skipped']
+
+DEFAULT_PORTS = {'http': 80, 'https': 443, 'ftp': 21}
+
+# URL scheme -> SpeedTestEngine method that measures its throughput
+PROBE_BACKENDS = {'http': 'test_http_speed', 'https': 'test_http_speed', 'ftp': 'test_ftp_speed'}
+
+def get_hostname(url):
+    # Extract hostname from URL
+    try:
+        hostname = urlsplit(url if '://' in url else 'http://' + url).hostname
+        if hostname:
+            return hostname
+    except ValueError:
+        pass
+    if '://' in url:
+        hostname = url.split('://')[1].split('/')[0]
+    else:
+        hostname = url.split('/')[0]
+
+    # Handle port if present
+    if ':' in hostname:
+        hostname = hostname.split(':')[0]
+    return hostname
+
+def get_port(url):
+    try:
+        parts = urlsplit(url if '://' in url else 'http://' + url)
+        return parts.port or DEFAULT_PORTS.get(parts.scheme.lower(), 80)
+    except ValueError:
+        return 80
+
+def normalize_url(url):
+    # Lower-case scheme and host, drop default ports and fragments, "/" for an empty path
+    url = url.strip()
+    if '://' not in url:
+        url = 'http://' + url
+    try:
+        parts = urlsplit(url)
+        hostname = parts.hostname
+        port = parts.port
+    except ValueError:
+        return url
+    if not hostname:
+        return url
+
+    scheme = parts.scheme.lower()
+    netloc = f'[{hostname}]' if ':' in hostname else hostname
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc += f':{port}'
+    if parts.username:
+        userinfo = parts.username + (f':{parts.password}' if parts.password else '')
+        netloc = f'{userinfo}@{netloc}'
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+def origin(url):
+    # scheme://host:port, the key probe objects are cached under
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+def parse_url_line(line):
+    # One URL per line, optionally followed by the object to download from it:
+    #   http://server/  http://server/files/large.mkv
+    # Returns (URL, object URL or None), or None for blank and # comment lines
+    fields = line.split()
+    if not fields or fields[0].startswith('#'):
+        return None
+    return fields[0], fields[1] if len(fields) > 1 else None
+
+def parse_url_lines(lines):
+    # The URLs in order and a normalized URL -> object URL dict of overrides
+    urls = []
+    overrides = {}
+    for parsed in filter(None, map(parse_url_line, lines)):
+        urls.append(parsed[0])
+        if parsed[1]:
+            overrides[normalize_url(parsed[0])] = parsed[1]
+    return urls, overrides
+
+def endpoint_key(address, port):
+    return f'[{address}]:{port}' if ':' in address else f'{address}:{port}'
+
+class DNSCache:
+    def __init__(self, ttl=DNS_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}  # hostname -> (expires_at, address)
+        self._lock = threading.Lock()
+
+    def resolve(self, hostname, port=None):
+        try:
+            ipaddress.ip_address(hostname.strip('[]'))
+            return hostname
+        except ValueError:
+            pass
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(hostname)
+            if entry and entry[0] > now:
+                return entry[1]
+
+        address = socket.getaddrinfo(hostname, port, type=socket.SOCK_STREAM)[0][4][0]
+        with self._lock:
+            self._entries[hostname] = (now + self.ttl, address)
+        logger.debug("Resolved %s -> %s", hostname, address)
+        return address
+
+def make_connection_class(base, dns_cache, sockets=None, on_connect=None, on_request=None):
+    class CachedConnection(base):
+        # Whether the last request went out on a socket that was already open. urllib3
+        # reconnects a closed connection object in place, so counting requests per object
+        # would report fresh sockets as reused
+        socket_reused = False
+
+        def _new_conn(self):
+            hostname = self._dns_host
+            self._dns_host = dns_cache.resolve(hostname, self.port)
+            start_time = time.perf_counter()
+            try:
+                sock = super()._new_conn()
+            finally:
+                self._dns_host = hostname
+            if on_connect:
+                on_connect((time.perf_counter() - start_time) * 1000)
+            if sockets is not None:
+                sockets.add(sock)
+            return sock
+
+        def request(self, *args, **kwargs):
+            self.socket_reused = self.sock is not None
+            if sockets is not None and self.sock is not None:
+                # A pooled socket now belongs to the probe reusing it
+                sockets.add(self.sock)
+            result = super().request(*args, **kwargs)
+            if on_request:
+                on_request()
+            return result
+
+    return CachedConnection
+
+class NegativeCache:
+    # Hosts that keep failing the screening are skipped, doubling the wait each time
+    def __init__(self, entries=None, base=BACKOFF_BASE, maximum=BACKOFF_MAX):
+        self.base = base
+        self.maximum = maximum
+        self.entries = dict(entries or {})  # hostname -> (failures, retry_after)
+        self._lock = threading.Lock()
+
+    def should_skip(self, hostname, now=None):
+        entry = self.entries.get(hostname)
+        return entry is not None and entry[1] > (now or time.time())
+
+    def record_failure(self, hostname, now=None):
+        with self._lock:
+            failures = self.entries.get(hostname, (0, 0))[0] + 1
+            delay = min(self.maximum, self.base * 2 ** (failures - 1))
+            self.entries[hostname] = (failures, (now or time.time()) + delay)
+
+    def record_success(self, hostname):
+        with self._lock:
+            self.entries.pop(hostname, None)
+
+def create_session(dns_cache, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                   sockets=None, on_connect=None, on_request=None):
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class PooledAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                'http': type('CachedHTTPConnectionPool', (HTTPConnectionPool,), {
+                    'ConnectionCls': make_connection_class(HTTPConnection, dns_cache, sockets, on_connect, on_request)}),
+                'https': type('CachedHTTPSConnectionPool', (HTTPSConnectionPool,), {
+                    'ConnectionCls': make_connection_class(HTTPSConnection, dns_cache, sockets, on_connect, on_request)}),
+            }
+
+    session = requests.Session()
+    adapter = PooledAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def connection_reused(response):
+    connection = getattr(response.raw, 'connection', None)
+    return getattr(connection, 'socket_reused', False)
+
+class URLFeed:
+    # Pulls a lazy URL source on its own thread into a bounded queue, so a slow source
+    # (stdin, a shard waiting for its next batch) never blocks the scheduler loop
+    END = object()
+
+    def __init__(self, source, size=FEED_BUFFER):
+        self.queue = Queue(maxsize=size)
+        self.exhausted = False
+        self.closed = threading.Event()
+        threading.Thread(target=self.read, args=(source,), daemon=True, name="bdix-url-feed").start()
+
+    def read(self, source):
+        try:
+            for url in source:
+                if not self.put(url):
+                    return
+            self.put(self.END)
+        except Exception as e:
+            # Raised again on the scheduler thread by take()
+            self.put(e)
+
+    def put(self, item):
+        while not self.closed.is_set():
+            try:
+                self.queue.put(item, timeout=TICK_INTERVAL)
+                return True
+            except Full:
+                continue
+        return False
+
+    def take(self, limit, timeout=0):
+        # Up to limit URLs that have arrived, waiting at most timeout seconds for the first
+        batch = []
+        try:
+            item = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+            while True:
+                if item is self.END or isinstance(item, Exception):
+                    self.exhausted = True
+                    if item is not self.END:
+                        raise item
+                    break
+                batch.append(item)
+                if len(batch) >= limit:
+                    break
+                item = self.queue.get_nowait()
+        except Empty:
+            pass
+        return batch
+
+    def close(self):
+        self.closed.set()
+
+class SpeedTestEngine:
+    def __init__(self, on_result=None, on_progress=None, on_error=None, on_tick=None, on_timing=None,
+                 max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST,
+                 sample_size=SAMPLE_SIZE, chunk_size=CHUNK_SIZE,
+                 pool_maxsize=POOL_MAXSIZE, dns_ttl=DNS_CACHE_TTL,
+                 ping_count=PING_COUNT, ping_timeout=PING_TIMEOUT,
+                 screen_timeout=SCREEN_TIMEOUT, top_k=TOP_K, negative_cache=None,
+                 measure_window=MEASURE_WINDOW, ramp_up=RAMP_UP, streams=STREAMS,
+                 range_probe=RANGE_PROBE, probe_objects=None, probe_budget=PROBE_BUDGET, metrics=None):
+        self.on_result = on_result
+        self.on_progress = on_progress
+        self.on_error = on_error
+        self.on_tick = on_tick
+        self.on_timing = on_timing
+        self.max_workers = max(1, max_workers)
+        self.max_per_host = max(1, max_per_host)
+        self.sample_size = max(1, sample_size)
+        self.chunk_size = max(1, min(chunk_size, self.sample_size))
+        self.measure_window = measure_window
+        self.ramp_up = ramp_up
+        self.streams = max(1, streams)
+        self.pool_maxsize = max(pool_maxsize, self.max_per_host * self.streams)
+        # The budget covers connecting and requesting; a measurement window comes on top
+        self.probe_budget = probe_budget + (ramp_up + measure_window if measure_window > 0 else 0)
+        self.sockets = ProbeSockets()
+        self.metrics = metrics if metrics is not None else ScanMetrics()
+        self.timings = threading.local()  # .current: ProbeTiming of the probe on this thread
+        self.dns_times = {}               # hostname -> ms its lookup took
+        self.backoff_hostnames = set()
+        self.backoff_endpoints = set()
+        self.dns_cache = DNSCache(dns_ttl)
+        self.ping_sweep = PingSweep(count=ping_count, timeout=ping_timeout,
+                                    stop_check=lambda: not self.is_running)
+        self.ping_stats = {}
+        self.entries = {}
+        self.url_endpoints = {}
+        self.screen_timeout = screen_timeout
+        self.top_k = top_k
+        self.negative_cache = negative_cache if negative_cache is not None else NegativeCache()
+        self.range_probe = range_probe
+        self.probe_objects = probe_objects if probe_objects is not None else {}  # origin -> (URL, size)
+        self.overrides = {}
+        self.searched_origins = set()
+        self.discovery_locks = defaultdict(threading.Lock)
+        self.discovery_lock = threading.Lock()
+        self.session = None
+        self.ftp_probe = None
+        self.is_running = True
+
+    def emit_error(self, msg):
+        if self.on_error:
+            self.on_error(msg)
+
+    def run(self, urls, overrides=None, total=None):
+        # urls may be a list or any iterable; a lazy one is pulled in batches while
+        # earlier batches are already being probed. overrides: normalized URL -> object
+        # URL downloaded in its place. total: expected entries, for progress only.
+        self.overrides = overrides if overrides is not None else {}
+        self.session = create_session(self.dns_cache, pool_maxsize=self.pool_maxsize,
+                                      sockets=self.sockets, on_connect=self.note_connect,
+                                      on_request=self.note_request)
+        self.ftp_probe = FTPProbe(self.dns_cache, sockets=self.sockets, on_connect=self.note_connect,
+                                  on_request=self.note_request)
+        try:
+            if self.top_k and not hasattr(urls, '__len__'):
+                # Picking the K fastest hosts needs every host up front
+                urls = list(urls)
+            sized = hasattr(urls, '__len__')
+            batch_size = max(1, len(urls)) if sized else INGEST_BATCH
+            self.total_urls = total or (len(urls) if sized else 0)
+            self.completed = 0
+            self.ingested = 0
+            self.waiting = 0
+            self.last_progress = -1
+            logger.debug(f"Starting test with {self.total_urls or 'a stream of'} URLs "
+                         f"(max_workers={self.max_workers}, max_per_host={self.max_per_host})")
+
+            # The same URL written several ways is probed once and reported for each entry
+            self.entries = defaultdict(list)  # normalized URL -> URLs as given, until completed
+            self.url_endpoints = {}           # normalized URL -> (address, port)
+            self.addresses = {}               # hostname -> address, None when it failed
+            self.live = {}                    # (address, port) -> connect RTT for reachable endpoints
+            self.screened = set()
+            self.ping_stats = {}
+            # A list is sliced directly; anything lazy is read ahead on a thread of its own
+            source = iter(urls) if sized else None
+            feed = None if sized else URLFeed(urls)
+            exhausted = False
+
+            executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            # Resolving, screening and pinging a batch can block for a whole timeout on a
+            # silent host, so it runs here while the loop keeps probes moving
+            preparer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prepare")
+            try:
+                # Queue URLs per address so a busy host never holds up the others
+                host_queues = defaultdict(deque)  # address -> URLs waiting to start
+                host_active = defaultdict(int)    # address -> probes currently running
+                in_flight = {}                    # future -> (address, URL)
+                preparing = None                  # (future, new URLs) of the batch being prepared
+                while True:
+                    if not self.is_running:
+                        logger.info("Test stopped by user")
+                        break
+
+                    # Phase 1: host-level work for the next batch once the queue runs low
+                    if preparing and preparing[0].done():
+                        future, new_urls = preparing
+                        preparing = None
+                        selected = future.result()
+                        if not self.is_running:
+                            continue
+                        self.queue_batch(new_urls, selected, host_queues)
+                    if not preparing and not exhausted and self.waiting < batch_size:
+                        if feed:
+                            # Whatever has arrived; with nothing to probe, wait a tick for more
+                            idle = not host_queues and not in_flight
+                            batch = feed.take(batch_size, timeout=TICK_INTERVAL if idle else 0)
+                            exhausted = feed.exhausted
+                        else:
+                            batch = list(islice(source, batch_size))
+                            exhausted = len(batch) < batch_size
+                        if batch:
+                            new_urls = self.add_batch(batch)
+                            preparing = (preparer.submit(self.prepare_hosts, executor, new_urls), new_urls)
+                    elif not preparing and not host_queues and not in_flight:
+                        break
+
+                    # Phase 2: fill free slots from hosts that are below their limit
+                    for address in list(host_queues):
+                        queue = host_queues[address]
+                        while (queue and len(in_flight) < self.max_workers
+                               and host_active[address] < self.max_per_host):
+                            host_active[address] += 1
+                            self.waiting -= 1
+                            url = queue.popleft()
+                            in_flight[executor.submit(self.test_url, url)] = (address, url)
+                        if not queue:
+                            del host_queues[address]
+                        if len(in_flight) >= self.max_workers:
+                            break
+
+                    # A finished preparation wakes the loop as well as a finished probe
+                    pending = [*in_flight, preparing[0]] if preparing else in_flight
+                    done, _ = wait(pending, timeout=TICK_INTERVAL, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future not in in_flight:
+                            continue
+                        address, url = in_flight.pop(future)
+                        host_active[address] -= 1
+                        self.complete(url, future.result())
+
+                    # Wake probes stuck in a read past their deadline
+                    self.sockets.abort(expired_only=True)
+                    if self.on_tick:
+                        self.on_tick()
+            except BaseException:
+                # Ctrl+C or a crash: abort open sockets now instead of waiting for every probe
+                self.stop()
+                raise
+            finally:
+                if feed:
+                    feed.close()
+                # After a stop, probes still unwinding are left to finish on their own
+                preparer.shutdown(wait=self.is_running)
+                executor.shutdown(wait=self.is_running)
+
+            if self.is_running:
+                logger.info("Test completed successfully")
+                # Lines that were skipped at ingestion never complete, so finish the bar here
+                if self.on_progress and self.last_progress != 100:
+                    self.on_progress(100)
+        finally:
+            self.session.close()
+            self.ftp_probe.close()
+
+    def add_batch(self, batch):
+        # Register the entries of a batch; returns the URLs no earlier batch brought in
+        new_urls = []
+        for url in batch:
+            key = normalize_url(url)
+            if key not in self.entries:
+                new_urls.append(key)
+            self.entries[key].append(url)
+        self.ingested += len(batch)
+        return new_urls
+
+    def prepare_hosts(self, executor, new_urls):
+        # Resolve, screen and ping the hosts of new URLs that earlier batches did not
+        # cover. Runs on the preparation thread; returns the endpoints to measure
+        self.resolve_hosts(executor, {get_hostname(url) for url in new_urls} - self.addresses.keys())
+        for url in new_urls:
+            address = self.addresses.get(get_hostname(url))
+            if address is not None:
+                self.url_endpoints[url] = (address, get_port(url))
+        endpoints = {self.url_endpoints[url] for url in new_urls if url in self.url_endpoints}
+        self.live.update(self.screen_endpoints(endpoints - self.screened))
+        self.screened |= endpoints
+        if not self.is_running:
+            return set()
+        selected = self.select_endpoints(self.live)
+
+        # Ping every new address once in one batched sweep
+        targets = {address: (address, port) for address, port in selected if address not in self.ping_stats}
+        self.ping_stats.update(self.ping_sweep.sweep(targets))
+        logger.debug(f"Ping sweep finished for {len(targets)} hosts")
+        return selected
+
+    def queue_batch(self, new_urls, selected, host_queues):
+        # Queue the URLs of a prepared batch on live hosts and report the rest as failed
+        for url in new_urls:
+            endpoint = self.url_endpoints.get(url)
+            if endpoint in selected:
+                host_queues[endpoint[0]].append(url)
+                self.waiting += 1
+            elif endpoint in self.live:
+                # Reachable, but left out by top-K and not measured in this run
+                self.complete(url, ProbeResult(url, skipped='top_k'))
+            else:
+                # Hosts backing off were not tried; the rest are reported as failed
+                self.record_unreachable(url, endpoint)
+                self.complete(url, ProbeResult(url, skipped='backoff' if self.in_backoff(url, endpoint) else ''))
+
+    def complete(self, url, result):
+        # Fan the result out to every input entry that normalized to this URL
+        self.url_endpoints.pop(url, None)
+        for entry in self.entries.pop(url, ()):
+            self.completed += 1
+            if result is not None:
+                entry_result = result if entry == result.url else replace(result, url=entry)
+                log_event('result', **entry_result.as_dict())
+                if self.on_result:
+                    self.on_result(entry_result)
+
+        # Only report when the percentage actually changes
+        progress = int((self.completed / max(self.total_urls, self.ingested, 1)) * 100)
+        if self.on_progress and progress != self.last_progress:
+            self.on_progress(progress)
+            self.last_progress = progress
+
+    def resolve_hosts(self, executor, hostnames):
+        # Fills self.addresses for hosts that are not backing off; failures map to None
+        skipped = {hostname for hostname in hostnames if self.negative_cache.should_skip(hostname)}
+        self.skipped_hosts = len(skipped)
+        self.backoff_hostnames |= skipped
+        if skipped:
+            logger.debug(f"Skipping {len(skipped)} hostnames that failed recently: {sorted(skipped)}")
+        for hostname in skipped:
+            self.addresses[hostname] = None
+
+        pending = {executor.submit(self.resolve, hostname): hostname for hostname in hostnames - skipped}
+        while pending and self.is_running:
+            # getaddrinfo cannot be interrupted, so a stop stops waiting for it instead
+            done, _ = wait(pending, timeout=TICK_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                hostname = pending.pop(future)
+                address = future.result()
+                self.addresses[hostname] = address
+                if address is None:
+                    self.negative_cache.record_failure(hostname)
+
+    def screen_endpoints(self, endpoints):
+        # (address, port) -> connect RTT (ms) for endpoints that accepted a TCP connection
+        skipped = {endpoint for endpoint in endpoints
+                   if self.negative_cache.should_skip(endpoint_key(*endpoint))}
+        self.backoff_endpoints |= skipped
+        endpoints = endpoints - skipped
+        if self.screen_timeout <= 0:
+            return {endpoint: 0 for endpoint in endpoints}
+
+        targets = {endpoint_key(*endpoint): endpoint for endpoint in endpoints}
+        stats = self.ping_sweep.tcp_sweep(targets, count=1, timeout=self.screen_timeout,
+                                          accept_refused=False)
+        live = {}
+        for key, endpoint_stats in stats.items():
+            if endpoint_stats.received:
+                live[targets[key]] = endpoint_stats.avg
+                self.negative_cache.record_success(key)
+            elif self.is_running:
+                logger.warning(f"{key} did not accept a connection within {self.screen_timeout}s")
+                self.negative_cache.record_failure(key)
+        logger.info(f"Screening: {len(live)} of {len(targets)} endpoints reachable "
+                    f"({self.skipped_hosts} hostnames skipped by backoff)")
+        return live
+
+    def select_endpoints(self, live):
+        if not self.top_k or len(live) <= self.top_k:
+            return set(live)
+        return set(sorted(live, key=live.get)[:self.top_k])
+
+    def stop(self):
+        # Safe to call from any thread; open sockets are shut down so blocked reads return now
+        logger.info("Stopping engine")
+        self.is_running = False
+        self.sockets.abort()
+
+    def resolve(self, hostname):
+        start_time = time.perf_counter()
+        try:
+            address = self.dns_cache.resolve(hostname)
+        except OSError as e:
+            logger.warning(f"Could not resolve {hostname}: {e}")
+            address = None
+        # IP literals skip the lookup and would only flatten the histogram
+        if address != hostname:
+            self.dns_times[hostname] = (time.perf_counter() - start_time) * 1000
+            self.metrics.observe_dns(self.dns_times[hostname])
+        return address
+
+    def test_url(self, url):
+        if not self.is_running:
+            return None
+        try:
+            logger.debug("Testing URL: %s", url)
+            stats = self.test_ping(url)
+            if stats is None or not stats.received:
+                logger.warning("Ping test failed for %s", url)
+            ping_time = stats.avg if stats else -1
+            jitter = stats.jitter if stats else -1
+            loss = stats.loss if stats else 100
+
+            # One deadline covers connecting, requesting and downloading
+            timing = ProbeTiming(url, dns=self.dns_times.get(get_hostname(url), 0))
+            self.timings.current = timing
+            self.sockets.begin(time.monotonic() + self.probe_budget)
+            start_time = time.perf_counter()
+            try:
+                download_speed, peak, ttfb, reused = self.test_download_speed(url)
+            finally:
+                self.sockets.end()
+                self.timings.current = None
+            if not self.is_running:
+                # A measurement cut short by stop says nothing about the host
+                return None
+            timing.total = (time.perf_counter() - start_time) * 1000
+            if not timing.error and (ttfb < 0 or download_speed <= 0):
+                timing.error = 'NoData'
+            self.record_timing(timing)
+            logger.debug("Results for %s: Ping=%s, Jitter=%s, Loss=%s, Speed=%s, Peak=%s, TTFB=%s, Reused=%s",
+                         url, ping_time, jitter, loss, download_speed, peak, ttfb, reused)
+            return ProbeResult(url, ping_time, jitter, loss, download_speed, ttfb, reused, peak)
+        except Exception as e:
+            if not self.is_running:
+                return None
+            msg = f"Error testing {url}: {str(e)}"
+            logger.error(msg, exc_info=True)
+            self.emit_error(msg)
+            return None
+
+    def test_ping(self, url):
+        # Results come from the per-address sweep in run()
+        endpoint = self.url_endpoints.get(url)
+        return self.ping_stats.get(endpoint[0]) if endpoint else None
+
+    def test_download_speed(self, url):
+        # Dispatch on the URL scheme; every backend reports (speed, peak, ttfb, reused)
+        scheme = url.split('://')[0].lower() if '://' in url else 'http'
+        backend = PROBE_BACKENDS.get(scheme)
+        if backend is None:
+            msg = f"Unsupported scheme for {url}"
+            self.note_error('UnsupportedScheme')
+            logger.warning(msg)
+            self.emit_error(msg)
+            return 0, 0, -1, False
+        return getattr(self, backend)(url)
+
+    def probe_target(self, url):
+        # (URL to download, True if it came from discovery) for an HTTP URL
+        override = self.overrides.get(url)
+        if override or not self.range_probe:
+            return override or url, False
+
+        key = origin(url)
+        with self.discovery_lock:
+            lock = self.discovery_locks[key]
+        # Only the first probe on a host searches; the others wait for its answer
+        with lock:
+            if key not in self.probe_objects and key not in self.searched_origins:
+                # The search gets a budget of its own
+                self.sockets.set_deadline(time.monotonic() + self.probe_budget)
+                found = discover_object(self.session, url, timeout=self.probe_budget)
+                self.searched_origins.add(key)
+                if found:
+                    self.probe_objects[key] = found
+                else:
+                    logger.debug("No large file found on %s, measuring %s itself", key, url)
+        found = self.probe_objects.get(key)
+        return (found[0], True) if found else (url, False)
+
+    def open_http_stream(self, url, target):
+        target, discovered = target
+        headers = {}
+        if self.range_probe or target != url:
+            # A fixed byte window in sample mode, everything after the offset otherwise
+            end = RANGE_OFFSET + self.sample_size - 1 if self.measure_window <= 0 and self.streams == 1 else ''
+            headers['Range'] = f"bytes={RANGE_OFFSET}-{end}"
+        self.note_connect(-1)  # Only the connection used for the measurement counts
+        response = self.session.get(target, stream=True, timeout=self.sockets.remaining(), headers=headers)
+        reused = connection_reused(response)
+        if discovered and response.status_code in (404, 410):
+            # The cached file is gone; forget it and measure the URL itself
+            logger.debug("Probe object %s is gone, dropping it", target)
+            response.close()
+            self.probe_objects.pop(origin(url), None)
+            self.searched_origins.add(origin(url))
+            return self.open_http_stream(url, (url, False))
+        try:
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+        # A fully read body hands its connection back to the pool for reuse
+        return response.raw.readinto, response.close, reused
+
+    def test_http_speed(self, url):
+        from requests import RequestException
+        try:
+            # Discovery happens before the clock starts, so the search never counts as TTFB.
+            # The budget starts afresh after it, also for probes that waited on another's search
+            target = self.probe_target(url)
+            if self.range_probe:
+                self.sockets.set_deadline(time.monotonic() + self.probe_budget)
+            return self.measure_speed(url, lambda url: self.open_http_stream(url, target))
+
+        except RequestException as e:
+            return self.download_failed(url, f"Request error for {url}: {str(e)}", e)
+        except Exception as e:
+            return self.download_failed(url, f"Download test error for {url}: {str(e)}", e, unexpected=True)
+
+    def test_ftp_speed(self, url):
+        try:
+            return self.measure_speed(url, self.ftp_probe.open_stream)
+
+        except ftplib.all_errors as e:
+            return self.download_failed(url, f"FTP error for {url}: {str(e)}", e)
+        except Exception as e:
+            return self.download_failed(url, f"Download test error for {url}: {str(e)}", e, unexpected=True)
+
+    def download_failed(self, url, msg, error, unexpected=False):
+        # Errors from sockets we shut down ourselves are reported for what they are
+        if not self.is_running:
+            logger.debug("Download test for %s cut short by stop", url)
+            return 0, 0, -1, False
+        self.note_error(type(error).__name__)
+        if self.sockets.expired():
+            msg = f"Probe budget of {self.probe_budget:g}s exceeded for {url}"
+            self.note_error('ProbeTimeout')
+            unexpected = False
+        if unexpected:
+            logger.error(msg, exc_info=True)
+        else:
+            logger.warning(msg)
+        self.emit_error(msg)
+        return 0, 0, -1, False
+
+    def measure_speed(self, url, open_stream):
+        # open_stream(url) -> (readinto, finish, reused) for the backend's protocol
+        logger.debug("Testing download speed for %s", url)
+        start_time = time.perf_counter()
+        if self.measure_window <= 0 and self.streams == 1:
+            readinto, finish, reused = open_stream(url)
+            try:
+                result = self.sample_download(readinto, start_time)
+            finally:
+                finish()
+            if result is not None:
+                speed, ttfb = result
+                result = speed, speed, ttfb
+        else:
+            result, reused = self.measure_window_streams(url, open_stream, start_time)
+        return self.report_speed(url, result, reused)
+
+    def measure_window_streams(self, url, open_stream, start_time):
+        # Read from several parallel streams for a fixed window after ramp-up
+        meter = ThroughputMeter(start_time, self.ramp_up, self.measure_window, PEAK_INTERVAL)
+        errors = []
+        reused = []
+        deadline = self.sockets.deadline()
+
+        def stream():
+            try:
+                readinto, finish, stream_reused = open_stream(url)
+            except Exception as e:
+                errors.append(e)
+                return
+            reused.append(stream_reused)
+            view = memoryview(bytearray(self.chunk_size))
+            try:
+                while self.is_running and not meter.done() and not self.sockets.expired():
+                    read = readinto(view)
+                    if not read:
+                        break
+                    meter.add(read)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                finish()
+
+        def extra_stream():
+            # Extra streams run on their own threads under the same probe deadline
+            self.sockets.begin(deadline)
+            try:
+                stream()
+            finally:
+                self.sockets.end()
+
+        threads = [threading.Thread(target=extra_stream, daemon=True) for _ in range(self.streams - 1)]
+        for thread in threads:
+            thread.start()
+        stream()
+        for thread in threads:
+            thread.join()
+
+        if not self.is_running:
+            return None, any(reused)
+        if meter.first_byte_time is not None:
+            self.note_transfer(start_time, meter.first_byte_time, meter.last_byte_time, meter.total_bytes)
+        result = meter.result()
+        if result is None:
+            if errors:
+                raise errors[0]
+            result = 0, 0, -1  # No byte arrived
+        elif errors:
+            logger.debug("%d of %d streams failed for %s: %s", len(errors), self.streams, url, errors[0])
+        return result, any(reused)
+
+    # ---------------- Probe Timing ----------------
+    def note_connect(self, ms):
+        timing = getattr(self.timings, 'current', None)
+        if timing:
+            timing.connect = ms
+
+    def note_request(self):
+        # The request of the probe on this thread went out; first byte counts from here
+        self.timings.request_time = time.perf_counter()
+
+    def note_transfer(self, start_time, first_byte_time, last_byte_time, size):
+        timing = getattr(self.timings, 'current', None)
+        if timing:
+            # Requests from before the measurement started (discovery) do not count
+            sent = max(getattr(self.timings, 'request_time', 0), start_time)
+            timing.first_byte = max(0, first_byte_time - sent) * 1000
+            timing.transfer = (last_byte_time - first_byte_time) * 1000
+            timing.bytes = size
+
+    def note_error(self, error):
+        timing = getattr(self.timings, 'current', None)
+        if timing:
+            timing.error = error
+
+    def in_backoff(self, url, endpoint):
+        # The host or endpoint failed recently and was skipped without being tried
+        return get_hostname(url) in self.backoff_hostnames or endpoint in self.backoff_endpoints
+
+    def record_unreachable(self, url, endpoint):
+        hostname = get_hostname(url)
+        error = ('Backoff' if self.in_backoff(url, endpoint) else
+                 'DNSError' if endpoint is None else 'Unreachable')
+        self.record_timing(ProbeTiming(url, dns=self.dns_times.get(hostname, -1), error=error))
+
+    def record_timing(self, timing):
+        self.metrics.record(timing)
+        log_event('timing', **timing.as_dict())
+        logger.debug("Timing for %s: DNS=%.1f Connect=%.1f FirstByte=%.1f Transfer=%.1f Total=%.1f ms, "
+                     "%d bytes %s", timing.url, timing.dns, timing.connect, timing.first_byte,
+                     timing.transfer, timing.total, timing.bytes, timing.error)
+        if self.on_timing:
+            self.on_timing(timing)
+
+    def report_speed(self, url, result, reused):
+        if result is None:
+            logger.debug("Download test stopped by user")
+            return 0, 0, -1, reused
+
+        speed, peak, ttfb = result
+        logger.debug("Download speed for %s: %.2f Mbps sustained, %.2f Mbps peak (TTFB %.2f ms, %s connection)",
+                     url, speed, peak, ttfb, 'reused' if reused else 'new')
+        return speed, peak, ttfb, reused
+
+    def sample_download(self, readinto, start_time):
+        # Read into one reusable buffer; the bytes themselves are never kept
+        buffer = bytearray(self.chunk_size)
+        view = memoryview(buffer)
+        first_byte_time = None
+        first_chunk_size = 0
+        content_size = 0
+
+        while content_size < self.sample_size:
+            if not self.is_running:
+                return None
+            if self.sockets.expired():
+                # Out of budget: the rate comes from the bytes that did arrive
+                logger.debug("Probe budget ran out after %d bytes", content_size)
+                break
+
+            read = readinto(view[:min(self.chunk_size, self.sample_size - content_size)])
+            if not read:
+                break
+            if first_byte_time is None:
+                first_byte_time = time.perf_counter()
+                first_chunk_size = read
+            content_size += read
+
+        end_time = time.perf_counter()
+        if first_byte_time is None:
+            return 0, -1  # No byte arrived
+        self.note_transfer(start_time, first_byte_time, end_time, content_size)
+
+        ttfb = (first_byte_time - start_time) * 1000  # ms
+
+        # Steady-state throughput excludes request setup and the first chunk
+        steady_bytes = content_size - first_chunk_size
+        elapsed_time = end_time - first_byte_time
+        if steady_bytes <= 0:
+            # Whole sample arrived in one read, so there is no steady state to measure
+            steady_bytes = content_size
+            elapsed_time = end_time - start_time
+        if elapsed_time < 0.001:
+            elapsed_time = 0.001
+
+        speed = (steady_bytes * 8) / (elapsed_time * 1_000_000)  # Mbps
+        return speed, ttfb
@@ -0,0 +1,71 @@
+# ---------------- BDIX Result Export ----------------
+# Streaming writers for probe results and rankings. Rows are written one at a
+# time straight from the result data, keeping raw numbers (-1 marks a failed
+# measurement), so exporting needs no memory proportional to the result set.
+# openpyxl is only imported when an .xlsx file is written.
+import os
+import csv
+import json
+
+from bdix_engine import RESULT_FIELDS
+
+EXPORT_FORMATS = {'.xlsx': 'xlsx', '.csv': 'csv', '.jsonl': 'jsonl'}
+XLSX_HEADERS = ['URL', 'Ping (ms)', 'Jitter (ms)', 'Loss (%)', 'Download Speed (Mbps)',
+                'Peak Speed (Mbps)', 'TTFB (ms)', 'Reused Connection', 'Skipped']
+# Headers for bdix_store.RANKING_FIELDS, one aggregated row per URL
+RANKING_HEADERS = ['Rank', 'URL', 'Score', 'Runs', 'Failed Runs (%)', 'Loss (%)', 'Ping p50 (ms)',
+                   'Ping p95 (ms)', 'Jitter (ms)', 'Download Speed p50 (Mbps)',
+                   'Download Speed p10 (Mbps)', 'Peak Speed (Mbps)', 'TTFB p50 (ms)', 'TTFB p95 (ms)',
+                   'Stability']
+
+class JSONLWriter:
+    def __init__(self, out, fields=RESULT_FIELDS):
+        self.out = out
+        self.fields = fields
+
+    def write(self, result):
+        self.out.write(json.dumps({field: getattr(result, field) for field in self.fields}) + '\n')
+
+class CSVWriter:
+    def __init__(self, out, fields=RESULT_FIELDS):
+        self.writer = csv.writer(out)
+        self.fields = fields
+        self.writer.writerow(fields)
+
+    def write(self, result):
+        self.writer.writerow([getattr(result, field) for field in self.fields])
+
+STREAM_WRITERS = {'csv': CSVWriter, 'jsonl': JSONLWriter}
+
+def export_format(file_path):
+    return EXPORT_FORMATS.get(os.path.splitext(file_path)[1].lower())
+
+def export_results(results, file_path, fmt=None, fields=RESULT_FIELDS, headers=XLSX_HEADERS):
+    # fields are the attributes written for each result; headers name them in .xlsx files
+    fmt = fmt or export_format(file_path)
+    if fmt == 'xlsx':
+        return write_xlsx(results, file_path, fields, headers)
+    if fmt not in STREAM_WRITERS:
+        raise ValueError(f"Unsupported export format: {file_path}")
+
+    count = 0
+    with open(file_path, 'w', encoding='utf-8', newline='') as out:
+        writer = STREAM_WRITERS[fmt](out, fields)
+        for result in results:
+            writer.write(result)
+            count += 1
+    return count
+
+def write_xlsx(results, file_path, fields=RESULT_FIELDS, headers=XLSX_HEADERS):
+    from openpyxl import Workbook
+
+    # Write-only workbooks stream rows to disk instead of keeping every cell
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Speed Test Results")
+    ws.append(headers)
+    count = 0
+    for result in results:
+        ws.append([getattr(result, field) for field in fields])
+        count += 1
+    wb.save(file_path)
+    return count
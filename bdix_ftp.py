@@ -0,0 +1,177 @@
+# ---------------- BDIX FTP Probe ----------------
+# Native FTP backend for ftp:// entries. Control connections are logged in once
+# and reused between probes of the same server; transfers use passive mode.
+# For directory URLs the server is listed to find a large file, so the
+# throughput sample measures a real transfer instead of a directory listing.
+import time
+import ftplib
+import logging
+import threading
+from collections import deque
+from urllib.parse import urlsplit, unquote
+
+logger = logging.getLogger("BDIX Speed Test")
+
+FTP_TIMEOUT = 10         # Seconds for connect, login and each socket read (capped by the probe budget)
+FTP_SEARCH_DEPTH = 2     # Directory levels searched below the URL path
+FTP_SEARCH_DIRS = 20     # Directories listed at most while looking for a file
+FTP_MIN_FILE_SIZE = 1024 * 1024  # A file this large ends the search early
+
+def parse_list_line(line):
+    # Unix style LIST output: "-rw-r--r-- 1 owner group 12345 Jan 01 12:00 name"
+    fields = line.split(None, 8)
+    if len(fields) < 9 or fields[0][0] not in '-dl':
+        return None
+    try:
+        size = int(fields[4])
+    except ValueError:
+        return None
+    kind = 'dir' if fields[0][0] == 'd' else 'file' if fields[0][0] == '-' else 'link'
+    return fields[8], kind, size
+
+class FTPProbe:
+    def __init__(self, dns_cache, timeout=FTP_TIMEOUT, sockets=None, on_connect=None, on_request=None):
+        self.dns_cache = dns_cache
+        self.timeout = timeout
+        self.sockets = sockets  # ProbeSockets that can abort our connections, if any
+        self.on_connect = on_connect  # Called with the ms a new control connection took
+        self.on_request = on_request  # Called as the transfer is requested
+        self._idle = {}    # (host, port, user) -> idle logged-in FTP connections
+        self._files = {}   # (host, port, path) -> (file path, size) found by the search
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            connections = [ftp for idle in self._idle.values() for ftp in idle]
+            self._idle.clear()
+        for ftp in connections:
+            try:
+                ftp.quit()
+            except ftplib.all_errors:
+                ftp.close()
+
+    def acquire(self, parts):
+        key = (parts.hostname, parts.port or 21, parts.username or 'anonymous')
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                ftp = idle.pop() if idle else None
+            if ftp is None:
+                break
+            try:
+                self.track(ftp.sock)
+                ftp.timeout = self.socket_timeout()
+                ftp.sock.settimeout(ftp.timeout)
+                ftp.voidcmd('NOOP')
+                return key, ftp, True
+            except ftplib.all_errors:
+                ftp.close()
+
+        ftp = ftplib.FTP(timeout=self.socket_timeout())
+        address = self.dns_cache.resolve(parts.hostname)
+        start_time = time.perf_counter()
+        ftp.connect(address, parts.port or 21)
+        if self.on_connect:
+            self.on_connect((time.perf_counter() - start_time) * 1000)
+        self.track(ftp.sock)
+        ftp.login(unquote(parts.username or 'anonymous'), unquote(parts.password or ''))
+        ftp.set_pasv(True)
+        return key, ftp, False
+
+    def socket_timeout(self):
+        return self.sockets.remaining(self.timeout) if self.sockets else self.timeout
+
+    def track(self, sock):
+        if self.sockets:
+            self.sockets.add(sock)
+
+    def release(self, key, ftp):
+        with self._lock:
+            self._idle.setdefault(key, []).append(ftp)
+
+    def find_file(self, ftp, parts):
+        # The URL itself if it names a file, else the largest file found under it
+        path = unquote(parts.path or '/')
+        cache_key = (parts.hostname, parts.port or 21, path)
+        cached = self._files.get(cache_key)
+        if cached:
+            return cached
+        if not path.endswith('/'):
+            try:
+                # SIZE is only allowed in binary mode; listings switch back to ASCII
+                ftp.voidcmd('TYPE I')
+                found = (path, ftp.size(path) or 0)
+                self._files[cache_key] = found
+                return found
+            except ftplib.error_perm:
+                path += '/'
+
+        best = (None, -1)
+        pending = deque([(path, 0)])
+        listed = 0
+        while pending and listed < FTP_SEARCH_DIRS and best[1] < FTP_MIN_FILE_SIZE:
+            directory, depth = pending.popleft()
+            listed += 1
+            for name, kind, size in self.list_dir(ftp, directory):
+                if name in ('.', '..'):
+                    continue
+                full_path = directory.rstrip('/') + '/' + name
+                if kind == 'file' and size > best[1]:
+                    best = (full_path, size)
+                elif kind == 'dir' and depth < FTP_SEARCH_DEPTH:
+                    pending.append((full_path + '/', depth + 1))
+
+        if best[0] is None:
+            raise ftplib.error_perm(f"550 No file found under {path}")
+        logger.debug("FTP probe file for %s: %s (%d bytes)", parts.hostname, best[0], best[1])
+        self._files[cache_key] = best
+        return best
+
+    def list_dir(self, ftp, directory):
+        try:
+            entries = []
+            for name, facts in ftp.mlsd(directory, facts=['type', 'size']):
+                kind = facts.get('type', '')
+                entries.append((name, 'dir' if kind == 'dir' else 'file' if kind == 'file' else kind,
+                                int(facts.get('size', 0) or 0)))
+            return entries
+        except ftplib.error_perm:
+            pass
+
+        # Servers without MLSD: fall back to parsing LIST output
+        lines = []
+        try:
+            ftp.retrlines(f'LIST {directory}', lines.append)
+        except ftplib.error_perm as e:
+            logger.debug("FTP LIST %s failed: %s", directory, e)
+            return []
+        return [entry for entry in map(parse_list_line, lines) if entry]
+
+    def open_stream(self, url):
+        # Start a transfer; returns (readinto, finish, reused) like the HTTP backend
+        parts = urlsplit(url)
+        key, ftp, reused = self.acquire(parts)
+        try:
+            path, _ = self.find_file(ftp, parts)
+            ftp.voidcmd('TYPE I')
+            if self.on_request:
+                self.on_request()
+            connection = ftp.transfercmd(f'RETR {path}')
+            self.track(connection)
+        except BaseException:
+            ftp.close()
+            raise
+
+        def finish():
+            connection.close()
+            # The server answers 226 for a complete transfer or 426 when we cut it short
+            try:
+                ftp.voidresp()
+            except (ftplib.error_temp, ftplib.error_perm):
+                pass
+            except ftplib.all_errors:
+                ftp.close()
+                return
+            self.release(key, ftp)
+
+        return connection.recv_into, finish, reused
@@ -0,0 +1,165 @@
+# ---------------- BDIX Result History ----------------
+# Keeps every probe result in a local SQLite database so results survive
+# between runs. The latest result per URL is kept in its own table, which
+# lets incremental scans pick out only the URLs that need re-testing and lets
+# the GUI show cached results as soon as a list is opened.
+import time
+import sqlite3
+import logging
+import threading
+from itertools import islice
+
+from bdix_engine import ProbeResult
+
+logger = logging.getLogger("BDIX Speed Test")
+
+HISTORY_DB = "speed_test_history.db"
+HISTORY_TTL = 24 * 60 * 60  # Seconds before a successful result is considered stale
+QUERY_CHUNK = 500           # URLs per query, below SQLite's parameter limit
+PROBE_OBJECT_TTL = 7 * 24 * 60 * 60  # Seconds a discovered probe object is trusted
+RANKING_WINDOW = 7 * 24 * 60 * 60    # Seconds of past runs aggregated into a ranking
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    tested_at REAL NOT NULL,
+    ping REAL, jitter REAL, loss REAL, speed REAL, ttfb REAL, reused INTEGER
+);
+CREATE INDEX IF NOT EXISTS samples_url_time ON samples (url, tested_at);
+CREATE TABLE IF NOT EXISTS latest (
+    url TEXT PRIMARY KEY,
+    tested_at REAL NOT NULL,
+    ping REAL, jitter REAL, loss REAL, speed REAL, ttfb REAL, reused INTEGER,
+    ok INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS host_backoff (
+    host TEXT PRIMARY KEY,
+    failures INTEGER NOT NULL,
+    retry_after REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS probe_objects (
+    origin TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    found_at REAL NOT NULL
+);
+"""
+
+# Columns added after the first release: (table, column, declaration)
+MIGRATIONS = [
+    ('samples', 'peak', 'REAL NOT NULL DEFAULT 0'),
+    ('latest', 'peak', 'REAL NOT NULL DEFAULT 0'),
+]
+
+def probe_ok(result):
+    # A probe counts as failed when no data could be downloaded
+    return result.ttfb >= 0 and result.speed > 0
+
+class ResultHistory:
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        # Results are recorded from the worker thread and read from the GUI thread
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+            for table, column, declaration in MIGRATIONS:
+                columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def record(self, results, tested_at=None):
+        # URLs skipped by backoff or top-K were not probed and leave no sample
+        results = [r for r in results if not r.skipped]
+        tested_at = tested_at or time.time()
+        rows = [(r.url, tested_at, r.ping, r.jitter, r.loss, r.speed, r.ttfb, int(r.reused), r.peak)
+                for r in results]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO samples (url, tested_at, ping, jitter, loss, speed, ttfb, reused, peak) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO latest (url, tested_at, ping, jitter, loss, speed, ttfb, reused, peak, ok) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row + (int(probe_ok(result)),) for row, result in zip(rows, results)])
+
+    def _latest_rows(self, urls):
+        urls = list(urls)
+        with self._lock:
+            for start in range(0, len(urls), QUERY_CHUNK):
+                chunk = urls[start:start + QUERY_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                yield from self._conn.execute(
+                    "SELECT url, tested_at, ping, jitter, loss, speed, ttfb, reused, ok, peak "
+                    f"FROM latest WHERE url IN ({placeholders})", chunk).fetchall()
+
+    def iter_stale(self, urls, ttl=HISTORY_TTL, on_fresh=None, now=None):
+        # URLs never tested, failed last time, or older than the TTL, in input order; read
+        # lazily for streamed input. Fresh results go to on_fresh(ProbeResult)
+        urls = iter(urls)
+        while True:
+            chunk = list(islice(urls, QUERY_CHUNK))
+            if not chunk:
+                return
+            current = now or time.time()
+            fresh = {}
+            for row in self._latest_rows(chunk):
+                if row[8] and current - row[1] < ttl:
+                    fresh[row[0]] = ProbeResult(row[0], row[2], row[3], row[4], row[5], row[6], bool(row[7]), row[9])
+            for url in chunk:
+                if url not in fresh:
+                    yield url
+                elif on_fresh:
+                    on_fresh(fresh[url])
+
+    def load_backoff(self):
+        # hostname -> (failures, retry_after), the state of the engine's NegativeCache
+        with self._lock:
+            rows = self._conn.execute("SELECT host, failures, retry_after FROM host_backoff").fetchall()
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def save_backoff(self, entries):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM host_backoff")
+            self._conn.executemany(
+                "INSERT INTO host_backoff (host, failures, retry_after) VALUES (?, ?, ?)",
+                [(host, failures, retry_after) for host, (failures, retry_after) in entries.items()])
+
+    def load_probe_objects(self, ttl=PROBE_OBJECT_TTL, now=None):
+        # origin -> (object URL, size) for files discovered within the TTL
+        now = now or time.time()
+        with self._lock:
+            rows = self._conn.execute("SELECT origin, url, size FROM probe_objects WHERE found_at > ?",
+                                      (now - ttl,)).fetchall()
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def save_probe_objects(self, entries, now=None):
+        # Files that are unchanged keep the time they were first found
+        now = now or time.time()
+        with self._lock, self._conn:
+            found_at = {row[0]: row[2] for row in self._conn.execute("SELECT origin, url, found_at FROM probe_objects")
+                        if row[0] in entries and entries[row[0]][0] == row[1]}
+            self._conn.execute("DELETE FROM probe_objects")
+            self._conn.executemany(
+                "INSERT INTO probe_objects (origin, url, size, found_at) VALUES (?, ?, ?, ?)",
+                [(key, url, size, found_at.get(key, now)) for key, (url, size) in entries.items()])
+
+    def iter_samples(self, urls, since=0):
+        # Every result recorded for these URLs after `since`, for aggregating repeated runs
+        urls = list(urls)
+        with self._lock:
+            for start in range(0, len(urls), QUERY_CHUNK):
+                chunk = urls[start:start + QUERY_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    "SELECT url, ping, jitter, loss, speed, ttfb, reused, peak FROM samples "
+                    f"WHERE url IN ({placeholders}) AND tested_at > ?", chunk + [since]).fetchall()
+                for row in rows:
+                    yield ProbeResult(row[0], row[1], row[2], row[3], row[4], row[5], bool(row[6]), row[7])
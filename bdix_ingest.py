@@ -0,0 +1,127 @@
+# ---------------- BDIX URL Ingestion ----------------
+# Streams URLs from any number of files and directories without loading them
+# into memory. Each line is validated and normalized, duplicates are dropped
+# using a set of 64-bit digests instead of the URL strings, and accepted URLs
+# are yielded one at a time so the engine starts probing while the rest of
+# the list is still being read.
+import os
+import re
+import sys
+import hashlib
+import ipaddress
+import logging
+from urllib.parse import urlsplit
+
+from bdix_engine import normalize_url, parse_url_line, PROBE_BACKENDS
+
+logger = logging.getLogger("BDIX Speed Test")
+
+URL_FILE_EXTENSIONS = ('.txt', '.lst', '.list', '.urls')  # Files picked up inside directories
+COUNT_BUFFER = 1024 * 1024  # Bytes read at a time when counting lines
+OVERRIDE_SCHEMES = ('http', 'https')  # Backends that can download another object in a URL's place
+HOSTNAME_PATTERN = re.compile(r'^[a-z0-9_]([a-z0-9_-]*[a-z0-9_])?(\.[a-z0-9_]([a-z0-9_-]*[a-z0-9_])?)*\.?$')
+
+def url_digest(url):
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8', 'surrogateescape'), digest_size=8).digest(),
+                          'little')
+
+def iter_files(paths):
+    # Files as given, directories walked in name order; '-' is stdin
+    for path in paths:
+        if path != '-' and os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(URL_FILE_EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def validate_url(url):
+    # Normalized URL, or None when it cannot be probed
+    normalized = normalize_url(url)
+    try:
+        parts = urlsplit(normalized)
+        parts.port
+    except ValueError:
+        return None
+    if parts.scheme not in PROBE_BACKENDS or not parts.hostname:
+        return None
+    if '://' not in url and parts.username:
+        # "mailto:user@host" and the like, not a bare host name
+        return None
+    if not HOSTNAME_PATTERN.match(parts.hostname):
+        try:
+            ipaddress.ip_address(parts.hostname)
+        except ValueError:
+            return None
+    return normalized
+
+def validate_override(url, override):
+    # Normalized object URL to download in place of the normalized url, or None
+    target = validate_url(override)
+    if target is None or urlsplit(target).scheme not in OVERRIDE_SCHEMES:
+        return None
+    return target if urlsplit(url).scheme in OVERRIDE_SCHEMES else None
+
+class URLIngest:
+    def __init__(self, paths):
+        self.paths = list(paths)
+        self.overrides = {}  # normalized URL -> object URL, filled while reading
+        self.seen = set()    # digests of URLs already yielded
+        self.accepted = 0
+        self.duplicates = 0
+        self.invalid = 0
+
+    def __iter__(self):
+        for path in iter_files(self.paths):
+            try:
+                file = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8', errors='replace')
+            except OSError as e:
+                logger.error(f"Failed to read file: {e}")
+                continue
+            try:
+                yield from self.read(file, path)
+            finally:
+                if file is not sys.stdin:
+                    file.close()
+        logger.info(f"Loaded {self.accepted} URLs ({self.duplicates} duplicates and "
+                    f"{self.invalid} invalid entries skipped)")
+
+    def read(self, file, path):
+        for number, line in enumerate(file, 1):
+            parsed = parse_url_line(line)
+            if parsed is None:
+                continue
+            url, override = parsed
+            normalized = validate_url(url)
+            target = validate_override(normalized, override) if normalized and override else None
+            if normalized is None or (override and target is None):
+                self.invalid += 1
+                logger.debug("Skipping invalid URL on line %d of %s: %s", number, path, url)
+                continue
+            digest = url_digest(normalized)
+            if digest in self.seen:
+                self.duplicates += 1
+                continue
+            self.seen.add(digest)
+            if target:
+                self.overrides[normalized] = target
+            self.accepted += 1
+            yield normalized
+
+    def count_lines(self):
+        # Upper bound on the URLs to expect, for progress; 0 when reading stdin
+        total = 0
+        for path in iter_files(self.paths):
+            if path == '-':
+                return 0
+            try:
+                with open(path, 'rb') as file:
+                    for block in iter(lambda: file.read(COUNT_BUFFER), b''):
+                        total += block.count(b'\n')
+                    if file.tell() and not block.endswith(b'\n'):
+                        total += 1
+            except OSError:
+                pass
+        return total
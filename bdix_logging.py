@@ -0,0 +1,88 @@
+# ---------------- BDIX Logging ----------------
+# Log records are put on an in-memory queue and written by one background
+# thread, so probe threads never wait on the disk. The log file rotates by
+# size, records are only formatted when the writer gets to them, and DEBUG
+# calls cost next to nothing when the level is above DEBUG. Probe results can
+# also be written as a compact JSONL event stream.
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FILE = "speed_test.log"
+LOG_MAX_BYTES = 5 * 1024 * 1024  # Size at which the log file is rotated
+LOG_BACKUPS = 3                  # Rotated files kept next to the log
+LOG_LEVEL = os.environ.get("BDIX_LOG_LEVEL", "INFO").upper()  # DEBUG for per-probe detail
+EVENT_LOG = os.environ.get("BDIX_EVENT_LOG")  # JSONL file for probe events, off when unset
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+event_logger = logging.getLogger("BDIX Speed Test.events")
+event_logger.propagate = False
+event_logger.setLevel(logging.CRITICAL + 1)  # Off until an event stream is configured
+
+class LazyQueueHandler(QueueHandler):
+    # Hand records over as they are; the listener thread does the formatting.
+    # Records with a traceback are prepared here while the frames still exist.
+    def prepare(self, record):
+        if record.exc_info:
+            return super().prepare(record)
+        return record
+
+class EventFormatter(logging.Formatter):
+    def format(self, record):
+        event = {'time': round(record.created, 3), 'event': record.getMessage()}
+        event.update(getattr(record, 'fields', {}))
+        return json.dumps(event, separators=(',', ':'))
+
+def log_event(event, **fields):
+    if event_logger.isEnabledFor(logging.INFO):
+        event_logger.info(event, extra={'fields': fields})
+
+def is_event(record):
+    return record.name == event_logger.name
+
+def setup_logging(level=LOG_LEVEL, log_file=LOG_FILE, console_level=logging.INFO, event_file=None,
+                  console_format='%(levelname)s: %(message)s'):
+    # Returns the started QueueListener; it is stopped (and flushed) at exit
+    level = logging.getLevelName(level) if isinstance(level, str) else level
+    handlers = []
+    if log_file:
+        file_handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                                           encoding='utf-8', delay=True)
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+        file_handler.setLevel(level)
+        handlers.append(file_handler)
+    if console_level is not None:
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(logging.Formatter(console_format))
+        console_handler.setLevel(max(level, console_level))
+        handlers.append(console_handler)
+    for handler in handlers:
+        handler.addFilter(lambda record: not is_event(record))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(LazyQueueHandler(log_queue))
+    # The lowest level any handler wants, so records below it are never even created
+    root.setLevel(min([handler.level for handler in handlers] or [level]))
+
+    if event_file:
+        # Events share the queue and writer thread but go to their own file
+        event_handler = RotatingFileHandler(event_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                                            encoding='utf-8', delay=True)
+        event_handler.setFormatter(EventFormatter())
+        event_handler.addFilter(is_event)
+        handlers.append(event_handler)
+        event_logger.addHandler(LazyQueueHandler(log_queue))
+        event_logger.setLevel(logging.INFO)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
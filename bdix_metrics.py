@@ -0,0 +1,127 @@
+# ---------------- BDIX Probe Metrics ----------------
+# Per-probe timing breakdown (DNS, connect, first byte, transfer, total),
+# bytes moved and error class, plus histograms over the whole scan. A snapshot
+# can be written as JSON or in the Prometheus text exposition format, which
+# shows whether a slow host has a DNS, handshake or bandwidth problem.
+import json
+import time
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass, asdict
+
+# Upper bounds of the histogram buckets; +Inf is implied
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+PHASES = ['dns', 'connect', 'first_byte', 'transfer', 'total']
+
+@dataclass
+class ProbeTiming:
+    url: str
+    dns: float = -1          # ms to resolve the host (shared by every URL on it)
+    connect: float = -1      # ms for the TCP/control connection, -1 when one was reused
+    first_byte: float = -1   # ms from sending the request (PASV/RETR for FTP) to the first byte
+    transfer: float = -1     # ms from the first byte to the last
+    total: float = -1        # ms for the whole download test
+    bytes: int = 0           # payload bytes read
+    error: str = ''          # exception class name, empty when the probe worked
+
+    def as_dict(self):
+        return asdict(self)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        # (upper bound, observations <= bound) as Prometheus expects
+        total = 0
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            total += count
+            yield bound, total
+
+    def as_dict(self):
+        return {'buckets': {str(bound): count for bound, count in self.cumulative()},
+                'sum': self.sum, 'count': self.count}
+
+class ScanMetrics:
+    def __init__(self):
+        self.phases = {phase: Histogram(SECONDS_BUCKETS) for phase in PHASES}
+        self.bytes = Histogram(BYTES_BUCKETS)
+        self.outcomes = {'ok': 0, 'failed': 0}
+        self.errors = {}       # exception class -> count
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def observe_dns(self, ms):
+        # DNS is resolved once per host, so it is counted once per host as well
+        with self._lock:
+            self.phases['dns'].observe(ms / 1000)
+
+    def record(self, timing):
+        with self._lock:
+            for phase in PHASES[1:]:
+                value = getattr(timing, phase)
+                if value >= 0:
+                    self.phases[phase].observe(value / 1000)
+            self.bytes.observe(timing.bytes)
+            if timing.error:
+                self.outcomes['failed'] += 1
+                self.errors[timing.error] = self.errors.get(timing.error, 0) + 1
+            else:
+                self.outcomes['ok'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'started_at': self.started_at,
+                'taken_at': time.time(),
+                'probes': dict(self.outcomes),
+                'errors': dict(self.errors),
+                'bytes': self.bytes.as_dict(),
+                'phase_seconds': {phase: histogram.as_dict() for phase, histogram in self.phases.items()},
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=1)
+
+    def to_prometheus(self):
+        with self._lock:
+            lines = ['# HELP bdix_probe_phase_seconds Time spent in each phase of a probe',
+                     '# TYPE bdix_probe_phase_seconds histogram']
+            for phase, histogram in self.phases.items():
+                lines.extend(histogram_lines('bdix_probe_phase_seconds', histogram, f'phase="{phase}"'))
+            lines += ['# HELP bdix_probe_bytes Payload bytes read per probe',
+                      '# TYPE bdix_probe_bytes histogram']
+            lines.extend(histogram_lines('bdix_probe_bytes', self.bytes))
+            lines += ['# HELP bdix_probes_total Probes finished, by outcome',
+                      '# TYPE bdix_probes_total counter']
+            lines += [f'bdix_probes_total{{outcome="{outcome}"}} {count}'
+                      for outcome, count in self.outcomes.items()]
+            lines += ['# HELP bdix_probe_errors_total Failed probes, by error class',
+                      '# TYPE bdix_probe_errors_total counter']
+            lines += [f'bdix_probe_errors_total{{class="{error}"}} {count}'
+                      for error, count in sorted(self.errors.items())]
+        return '\n'.join(lines) + '\n'
+
+def histogram_lines(name, histogram, labels=''):
+    prefix = labels + ',' if labels else ''
+    for bound, count in histogram.cumulative():
+        yield f'{name}_bucket{{{prefix}le="{bound}"}} {count}'
+    suffix = f'{{{labels}}}' if labels else ''
+    yield f'{name}_sum{suffix} {histogram.sum:g}'
+    yield f'{name}_count{suffix} {histogram.count}'
+
+def write_metrics(metrics, path):
+    # JSON for *.json paths, Prometheus text format for everything else
+    text = metrics.to_json() if path.lower().endswith('.json') else metrics.to_prometheus()
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(text)
@@ -0,0 +1,209 @@
+# ---------------- BDIX Monitor ----------------
+# Long-running monitor mode: hosts are re-probed on a schedule and every
+# result is folded into fixed-size per-host ring buffers, so memory stays flat
+# however long it runs. Hosts whose speed swings a lot, and the fastest hosts,
+# are re-probed more often than the rest. snapshot() returns current p50/p95
+# latency and throughput per host without starting a new scan.
+import time
+import heapq
+import logging
+import threading
+import statistics
+from array import array
+from collections import defaultdict
+
+from bdix_engine import SpeedTestEngine, NegativeCache, get_hostname
+from bdix_history import probe_ok
+from bdix_metrics import ScanMetrics
+
+logger = logging.getLogger("BDIX Speed Test")
+
+# ---------------- Schedule Settings ----------------
+MONITOR_INTERVAL = 600      # Seconds between probes of an ordinary host
+MIN_INTERVAL = 60           # Seconds between probes of any host, however urgent
+VOLATILE_CV = 0.3           # Speed standard deviation / mean above which a host is volatile
+VOLATILE_FACTOR = 0.25      # Interval multiplier for volatile hosts
+HIGH_VALUE_FRACTION = 0.1   # Fastest share of hosts (by median speed) probed more often
+HIGH_VALUE_FACTOR = 0.5     # Interval multiplier for those hosts
+
+# ---------------- Statistics Settings ----------------
+RING_SIZE = 288             # Samples kept per host and metric (a day at 5 minute intervals)
+
+def percentile(values, p):
+    # Linear interpolation between the closest ranks, -1 when there are no values
+    if not values:
+        return -1
+    values = sorted(values)
+    rank = (len(values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+class RingBuffer:
+    # Fixed-size array that overwrites its oldest value once full
+    def __init__(self, size=RING_SIZE, typecode='d'):
+        self.size = max(1, size)
+        self.data = array(typecode, [0]) * self.size
+        self.count = 0
+        self.next = 0
+
+    def push(self, value):
+        self.data[self.next] = value
+        self.next = (self.next + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def values(self):
+        # Oldest first
+        if self.count < self.size:
+            return self.data[:self.count]
+        return self.data[self.next:] + self.data[:self.next]
+
+    def __len__(self):
+        return self.count
+
+class HostStats:
+    def __init__(self, host, size=RING_SIZE):
+        self.host = host
+        self.ping = RingBuffer(size)       # ms, hosts that answered only
+        self.speed = RingBuffer(size)      # Mbps, successful downloads only
+        self.ttfb = RingBuffer(size)       # ms, successful downloads only
+        self.outcomes = RingBuffer(size, 'b')  # 1 for a successful probe, 0 for a failed one
+        self.last_tested = None
+        self.next_due = None
+
+    def record(self, result, tested_at=None):
+        self.last_tested = tested_at or time.time()
+        ok = probe_ok(result)
+        self.outcomes.push(int(ok))
+        if result.ping >= 0:
+            self.ping.push(result.ping)
+        if ok:
+            self.speed.push(result.speed)
+            self.ttfb.push(result.ttfb)
+
+    def median_speed(self):
+        return percentile(self.speed.values(), 50)
+
+    def volatile(self):
+        # Recent failures or a wide spread of speeds both call for closer watching
+        outcomes = self.outcomes.values()
+        if outcomes and not all(outcomes[-3:]):
+            return True
+        speeds = self.speed.values()
+        if len(speeds) < 3:
+            return False
+        mean = statistics.mean(speeds)
+        return mean > 0 and statistics.pstdev(speeds) / mean > VOLATILE_CV
+
+    def summary(self):
+        outcomes = self.outcomes.values()
+        ping = self.ping.values()
+        speed = self.speed.values()
+        ttfb = self.ttfb.values()
+        return {
+            'host': self.host,
+            'samples': len(outcomes),
+            'success_rate': sum(outcomes) / len(outcomes) * 100 if outcomes else 0,
+            'ping_p50': percentile(ping, 50), 'ping_p95': percentile(ping, 95),
+            'speed_p50': percentile(speed, 50), 'speed_p95': percentile(speed, 95),
+            'ttfb_p50': percentile(ttfb, 50), 'ttfb_p95': percentile(ttfb, 95),
+            'volatile': self.volatile(),
+            'last_tested': self.last_tested,
+            'next_due': self.next_due,
+        }
+
+class Monitor:
+    def __init__(self, urls, overrides=None, interval=MONITOR_INTERVAL, min_interval=MIN_INTERVAL,
+                 ring_size=RING_SIZE, on_result=None, on_round=None, negative_cache=None,
+                 probe_objects=None, metrics=None, **settings):
+        self.overrides = overrides
+        self.interval = interval
+        self.min_interval = min(min_interval, interval)
+        self.on_result = on_result
+        self.on_round = on_round
+        self.negative_cache = negative_cache if negative_cache is not None else NegativeCache()
+        self.probe_objects = probe_objects if probe_objects is not None else {}
+        self.metrics = metrics if metrics is not None else ScanMetrics()  # across all rounds
+        self.settings = settings           # passed on to every SpeedTestEngine
+
+        self.host_urls = defaultdict(list)  # hostname -> URLs probed together
+        for url in urls:
+            self.host_urls[get_hostname(url)].append(url)
+        self.stats = {host: HostStats(host, ring_size) for host in self.host_urls}
+        # (due time, hostname); every host is probed once straight away
+        self.schedule = [(0, host) for host in self.host_urls]
+        heapq.heapify(self.schedule)
+
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.engine = None
+
+    def run(self):
+        logger.info(f"Monitoring {len(self.host_urls)} hosts (base interval {self.interval}s)")
+        while not self.stop_event.is_set():
+            now = time.time()
+            due = []
+            while self.schedule and self.schedule[0][0] <= now:
+                due.append(heapq.heappop(self.schedule)[1])
+            if not due:
+                self.stop_event.wait(self.schedule[0][0] - now)
+                continue
+
+            self.probe(due)
+            if self.stop_event.is_set():
+                break
+
+            now = time.time()
+            high_value = self.high_value_hosts()
+            with self.lock:
+                for host in due:
+                    stats = self.stats[host]
+                    stats.next_due = now + self.host_interval(stats, host in high_value)
+                    heapq.heappush(self.schedule, (stats.next_due, host))
+            if self.on_round:
+                self.on_round(self)
+        logger.info("Monitor stopped")
+
+    def probe(self, hosts):
+        urls = [url for host in hosts for url in self.host_urls[host]]
+        logger.debug(f"Re-probing {len(hosts)} hosts ({len(urls)} URLs)")
+        self.engine = SpeedTestEngine(on_result=self.record, negative_cache=self.negative_cache,
+                                      probe_objects=self.probe_objects, metrics=self.metrics,
+                                      **self.settings)
+        try:
+            self.engine.run(urls, self.overrides)
+        except Exception as e:
+            logger.error(f"Monitor round failed: {e}", exc_info=True)
+
+    def record(self, result):
+        if not result.skipped:
+            with self.lock:
+                self.stats[get_hostname(result.url)].record(result)
+        if self.on_result:
+            self.on_result(result)
+
+    def host_interval(self, stats, high_value):
+        interval = self.interval
+        if stats.volatile():
+            interval *= VOLATILE_FACTOR
+        if high_value:
+            interval *= HIGH_VALUE_FACTOR
+        return max(self.min_interval, interval)
+
+    def high_value_hosts(self):
+        with self.lock:
+            speeds = {host: stats.median_speed() for host, stats in self.stats.items()}
+        ranked = sorted((host for host in speeds if speeds[host] > 0), key=speeds.get, reverse=True)
+        if not ranked:
+            return set()
+        return set(ranked[:max(1, int(len(speeds) * HIGH_VALUE_FRACTION))])
+
+    def snapshot(self):
+        # Current per-host statistics; safe to call from any thread while running
+        with self.lock:
+            return [self.stats[host].summary() for host in sorted(self.stats)]
+
+    def stop(self):
+        self.stop_event.set()
+        if self.engine:
+            self.engine.stop()
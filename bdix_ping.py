@@ -0,0 +1,235 @@
+# ---------------- BDIX Ping Sweep ----------------
+# Sends ICMP echoes to many hosts from one socket and collects the replies as
+# they arrive, so a whole list is pinged in roughly one timeout window. When
+# ICMP sockets are not permitted (no root, Windows without admin) the sweep
+# measures TCP-connect RTT instead.
+import os
+import time
+import errno
+import socket
+import select
+import struct
+import logging
+import selectors
+from dataclasses import dataclass, field
+
+logger = logging.getLogger("BDIX Speed Test")
+
+PING_COUNT = 3        # Echoes sent to every host
+PING_TIMEOUT = 2      # Seconds to wait for the last reply
+PING_INTERVAL = 0.01  # Pause between rounds so bursts don't overflow the socket
+MAX_TCP_SOCKETS = 256 # Connects in flight at once for the TCP fallback
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+@dataclass
+class PingStats:
+    host: str
+    sent: int = 0
+    method: str = 'icmp'
+    samples: dict = field(default_factory=dict)  # sample index -> RTT in ms
+
+    @property
+    def received(self):
+        return len(self.samples)
+
+    @property
+    def rtts(self):
+        return [self.samples[i] for i in sorted(self.samples)]
+
+    @property
+    def min(self):
+        return min(self.samples.values()) if self.samples else -1
+
+    @property
+    def max(self):
+        return max(self.samples.values()) if self.samples else -1
+
+    @property
+    def avg(self):
+        return sum(self.samples.values()) / len(self.samples) if self.samples else -1
+
+    @property
+    def jitter(self):
+        # Mean difference between consecutive replies
+        rtts = self.rtts
+        if len(rtts) < 2:
+            return 0 if rtts else -1
+        return sum(abs(b - a) for a, b in zip(rtts, rtts[1:])) / (len(rtts) - 1)
+
+    @property
+    def loss(self):
+        if not self.sent:
+            return 100.0
+        return (self.sent - self.received) * 100.0 / self.sent
+
+def checksum(data):
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+def build_echo(identifier, sequence):
+    payload = b'bdix-speed-test!'
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum(header + payload), identifier, sequence)
+    return header + payload
+
+def open_icmp_socket():
+    # Raw sockets need privileges; Linux also offers unprivileged ICMP datagram sockets
+    for sock_type in (socket.SOCK_RAW, socket.SOCK_DGRAM):
+        try:
+            sock = socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP)
+            sock.setblocking(False)
+            return sock, sock_type == socket.SOCK_RAW
+        except OSError:
+            continue
+    return None, False
+
+class PingSweep:
+    def __init__(self, count=PING_COUNT, timeout=PING_TIMEOUT, interval=PING_INTERVAL,
+                 max_tcp_sockets=MAX_TCP_SOCKETS, stop_check=None):
+        self.count = max(1, count)
+        self.timeout = timeout
+        self.interval = interval
+        self.max_tcp_sockets = max(1, max_tcp_sockets)
+        self.stop_check = stop_check or (lambda: False)
+
+    def sweep(self, targets):
+        # targets: hostname -> (address, port); returns hostname -> PingStats
+        icmp_targets = {host: target for host, target in targets.items() if ':' not in target[0]}
+        sock, is_raw = open_icmp_socket() if icmp_targets else (None, False)
+        if sock is None:
+            return self.tcp_sweep(targets)
+
+        try:
+            stats = self.icmp_sweep(sock, is_raw, icmp_targets)
+        finally:
+            sock.close()
+
+        # IPv6 hosts are not covered by the ICMPv4 socket
+        others = {host: target for host, target in targets.items() if host not in icmp_targets}
+        if others:
+            stats.update(self.tcp_sweep(others))
+        return stats
+
+    def icmp_sweep(self, sock, is_raw, targets):
+        identifier = os.getpid() & 0xFFFF
+        stats = {host: PingStats(host) for host in targets}
+        outstanding = {}  # sequence -> (hostname, address, sample, sent_at)
+        sequence = 0
+
+        def receive(wait):
+            deadline = time.perf_counter() + wait
+            while outstanding:
+                remaining = deadline - time.perf_counter()
+                readable, _, _ = select.select([sock], [], [], max(0, remaining))
+                if not readable:
+                    return
+                while True:
+                    try:
+                        packet, (address, _) = sock.recvfrom(2048)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    received_at = time.perf_counter()
+                    if is_raw:
+                        packet = packet[(packet[0] & 0x0F) * 4:]
+                    if len(packet) < 8:
+                        continue
+                    icmp_type, _, _, reply_id, reply_seq = struct.unpack('!BBHHH', packet[:8])
+                    # Datagram sockets get their identifier rewritten by the kernel
+                    if icmp_type != ICMP_ECHO_REPLY or (is_raw and reply_id != identifier):
+                        continue
+                    entry = outstanding.get(reply_seq)
+                    if entry is None or entry[1] != address:
+                        continue
+                    del outstanding[reply_seq]
+                    host, _, sample, sent_at = entry
+                    stats[host].samples[sample] = (received_at - sent_at) * 1000
+                if remaining <= 0:
+                    return
+
+        for sample in range(self.count):
+            for host, (address, _) in targets.items():
+                if self.stop_check():
+                    return stats
+                sequence = (sequence + 1) & 0xFFFF
+                # Never reuse a sequence number that is still waiting for a reply
+                if sequence in outstanding:
+                    receive(self.timeout)
+                    outstanding.pop(sequence, None)
+                try:
+                    sock.sendto(build_echo(identifier, sequence), (address, 0))
+                except BlockingIOError:
+                    receive(self.interval)
+                    continue
+                except OSError as e:
+                    logger.debug("ICMP send to %s failed: %s", host, e)
+                    stats[host].sent += 1
+                    continue
+                stats[host].sent += 1
+                outstanding[sequence] = (host, address, sample, time.perf_counter())
+            receive(self.interval)
+
+        # Everything has been sent; give the slowest replies one timeout window
+        deadline = time.perf_counter() + self.timeout
+        while outstanding and not self.stop_check() and time.perf_counter() < deadline:
+            receive(min(0.2, deadline - time.perf_counter()))
+        return stats
+
+    def tcp_sweep(self, targets, count=None, timeout=None, accept_refused=True):
+        # accept_refused=False only counts hosts whose port actually accepted the connection
+        count = count or self.count
+        timeout = timeout or self.timeout
+        accepted = (0, errno.ECONNREFUSED) if accept_refused else (0,)
+        stats = {host: PingStats(host, method='tcp') for host in targets}
+        pending = [(host, sample) for sample in range(count) for host in targets]
+        pending.reverse()
+        selector = selectors.DefaultSelector()
+        in_flight = {}  # socket -> (hostname, sample, started_at)
+
+        try:
+            while pending or in_flight:
+                if self.stop_check():
+                    break
+
+                while pending and len(in_flight) < self.max_tcp_sockets:
+                    host, sample = pending.pop()
+                    address, port = targets[host]
+                    family = socket.AF_INET6 if ':' in address else socket.AF_INET
+                    sock = socket.socket(family, socket.SOCK_STREAM)
+                    sock.setblocking(False)
+                    stats[host].sent += 1
+                    started_at = time.perf_counter()
+                    result = sock.connect_ex((address, port))
+                    if result not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, getattr(errno, 'WSAEWOULDBLOCK', -1)):
+                        sock.close()
+                        continue
+                    in_flight[sock] = (host, sample, started_at)
+                    selector.register(sock, selectors.EVENT_WRITE)
+
+                for key, _ in selector.select(timeout=0.05):
+                    sock = key.fileobj
+                    host, sample, started_at = in_flight.pop(sock)
+                    rtt = (time.perf_counter() - started_at) * 1000
+                    error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    # A refused connection still proves the host answered
+                    if error in accepted:
+                        stats[host].samples[sample] = rtt
+                    selector.unregister(sock)
+                    sock.close()
+
+                now = time.perf_counter()
+                for sock, (host, sample, started_at) in list(in_flight.items()):
+                    if now - started_at >= timeout:
+                        del in_flight[sock]
+                        selector.unregister(sock)
+                        sock.close()
+        finally:
+            for sock in in_flight:
+                sock.close()
+            selector.close()
+        return stats
@@ -0,0 +1,479 @@
+# ---------------- BDIX Sharded Scanning ----------------
+# Splits a scan over several worker processes, each running its own
+# SpeedTestEngine, so parsing, probing and logging are spread over all CPU
+# cores instead of sharing one interpreter. URLs are sharded by hostname, which
+# keeps per-host limits, DNS and backoff state inside one shard. Shards can
+# also run on other machines: `python bdix_shard.py HOST:PORT` serves one shard
+# over an authenticated multiprocessing connection. Messages are JSON rather
+# than pickles, so a peer can only ever send data. The coordinator feeds
+# every shard in batches, with a small window of unacknowledged batches so
+# memory stays bounded, and merges results, timings and log records back into
+# the caller's callbacks.
+import os
+import sys
+import json
+import zlib
+import time
+import queue
+import signal
+import logging
+import argparse
+import threading
+import multiprocessing
+from itertools import islice
+from multiprocessing.connection import Client, Listener, wait
+
+import bdix_engine
+from bdix_engine import (SpeedTestEngine, NegativeCache, ProbeResult, URLFeed, get_hostname, TICK_INTERVAL,
+                         INGEST_BATCH)
+from bdix_metrics import ScanMetrics, ProbeTiming
+from bdix_logging import event_logger
+
+logger = logging.getLogger("BDIX Speed Test")
+
+SHARDS = os.cpu_count() or 1  # Local worker processes when all cores are used
+SHARD_BATCH = INGEST_BATCH    # URLs sent to a shard at a time
+SHARD_WINDOW = 2              # Batches a shard may hold before it acknowledges one
+SHARD_BACKLOG = 4 * SHARD_BATCH  # URLs buffered for one shard before input reading pauses
+SHARD_FLUSH = 0.1             # Seconds between result batches sent back by a shard
+STOP_GRACE = 5.0              # Seconds shards get to report back after a stop
+NODE_KEY = os.environ.get("BDIX_NODE_KEY", "")  # Shared secret for remote shards; there is no default
+NODE_ADDRESS = "127.0.0.1:7431"  # Where a node listens unless told otherwise
+MAX_MESSAGE = 64 * 1024 * 1024   # Bytes; longer messages drop the connection
+
+def shard_of(url, shards):
+    # Stable across processes and machines, unlike hash()
+    return zlib.crc32((get_hostname(url) or url).encode('utf-8', 'surrogateescape')) % shards
+
+def parse_address(address):
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+def send_message(conn, message):
+    conn.send_bytes(json.dumps(message).encode('utf-8'))
+
+def recv_message(conn):
+    try:
+        return json.loads(conn.recv_bytes(MAX_MESSAGE))
+    except ValueError as e:
+        raise EOFError(f"Malformed shard message: {e}") from None
+
+def as_tuples(entries):
+    # JSON turns the (a, b) values of backoff and probe object maps into lists
+    return {key: tuple(value) for key, value in (entries or {}).items()}
+
+# ---------------- Shard side ----------------
+
+class ShardSender:
+    # Probe threads, the engine loop and logging all send on the one connection
+    def __init__(self, conn):
+        self.conn = conn
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        with self._lock:
+            try:
+                send_message(self.conn, message)
+            except (OSError, EOFError):
+                pass
+
+class ShardLogHandler(logging.Handler):
+    # Log records and events travel to the coordinator and are written there
+    def __init__(self, sender):
+        super().__init__()
+        self.sender = sender
+
+    def emit(self, record):
+        try:
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            self.sender.send(('log', {key: value for key, value in vars(record).items()
+                                      if isinstance(value, (str, int, float, bool, list, dict, type(None)))}))
+        except Exception:
+            self.handleError(record)
+
+class MetricsRelay:
+    # Stands in for ScanMetrics in a shard; observations go back with the results
+    def __init__(self):
+        self.dns = []
+        self.timings = []
+        self._lock = threading.Lock()
+
+    def observe_dns(self, ms):
+        with self._lock:
+            self.dns.append(ms)
+
+    def record(self, timing):
+        with self._lock:
+            self.timings.append(timing)
+
+    def take(self):
+        with self._lock:
+            dns, timings = self.dns, self.timings
+            self.dns, self.timings = [], []
+        return dns, timings
+
+def serve_shard(conn):
+    # Runs one shard: ('start', settings, log level, events) first, then URL batches
+    sender = ShardSender(conn)
+    _, settings, level, events = recv_message(conn)
+    handler = ShardLogHandler(sender)
+    root = logging.getLogger()
+    saved = (root.handlers[:], root.level, event_logger.level)
+    for old in saved[0]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+    if events:
+        event_logger.addHandler(handler)
+        event_logger.setLevel(logging.INFO)
+    try:
+        run_shard(conn, sender, settings)
+    finally:
+        # A node keeps serving after this connection, with its own logging
+        root.removeHandler(handler)
+        event_logger.removeHandler(handler)
+        for old in saved[0]:
+            root.addHandler(old)
+        root.setLevel(saved[1])
+        event_logger.setLevel(saved[2])
+
+def run_shard(conn, sender, settings):
+    feed = queue.Queue()
+    overrides = {}
+    pending = []
+    relay = MetricsRelay()
+    last_flush = [0]
+    engine = SpeedTestEngine(on_result=pending.append,
+                             on_error=lambda msg: sender.send(('error', msg)),
+                             on_tick=lambda: flush(),
+                             negative_cache=NegativeCache(as_tuples(settings.pop('backoff', None))),
+                             probe_objects=as_tuples(settings.pop('probe_objects', None)),
+                             metrics=relay, **settings)
+
+    def flush(force=False):
+        now = time.monotonic()
+        if force or now - last_flush[0] >= SHARD_FLUSH:
+            results = pending[:]
+            del pending[:len(results)]
+            dns, timings = relay.take()
+            if results or dns or timings:
+                sender.send(('results', [result.as_dict() for result in results],
+                             [timing.as_dict() for timing in timings], dns))
+            last_flush[0] = now
+
+    def receive():
+        # Keeps listening after 'end' so a stop still gets through
+        while True:
+            try:
+                message = recv_message(conn)
+            except (OSError, EOFError):
+                engine.stop()
+                feed.put(None)
+                return
+            if message[0] == 'urls':
+                feed.put(message[1])
+            else:
+                if message[0] == 'stop':
+                    engine.stop()
+                feed.put(None)
+
+    def urls():
+        while True:
+            batch = feed.get()
+            if batch is None:
+                return
+            sender.send(('ack',))
+            for url, override in batch:
+                if override:
+                    overrides[url] = override
+                yield url
+
+    threading.Thread(target=receive, daemon=True).start()
+    try:
+        engine.run(urls(), overrides)
+    except Exception as e:
+        logger.critical(f"Shard crashed: {e}", exc_info=True)
+        sender.send(('error', f"Shard crashed: {e}"))
+    flush(force=True)
+    sender.send(('done', engine.negative_cache.entries, engine.probe_objects))
+
+def shard_process(conn):
+    # Ctrl+C reaches the whole process group; the coordinator decides when shards stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        serve_shard(conn)
+    finally:
+        conn.close()
+
+# ---------------- Coordinator side ----------------
+
+class Shard:
+    def __init__(self, name, conn, process=None):
+        self.name = name
+        self.conn = conn
+        self.process = process
+        self.pending = []  # (URL, override) waiting to be sent
+        self.credits = SHARD_WINDOW
+        self.ended = False
+        self.done = False
+        self.lost = False
+
+    def feed(self, exhausted):
+        # Full batches go out while there is credit; a partial one only when the shard
+        # would otherwise sit idle or no more input is coming
+        idle = self.credits == SHARD_WINDOW
+        while self.credits and (len(self.pending) >= SHARD_BATCH or ((exhausted or idle) and self.pending)):
+            send_message(self.conn, ('urls', self.pending[:SHARD_BATCH]))
+            del self.pending[:SHARD_BATCH]
+            self.credits -= 1
+        if exhausted and not self.pending and not self.ended:
+            send_message(self.conn, ('end',))
+            self.ended = True
+
+    def close(self):
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        if self.process is not None:
+            self.process.join(1)
+            if self.process.is_alive():
+                self.process.terminate()
+
+class ShardedScan:
+    # Same callbacks and state as SpeedTestEngine, so callers can use either. Each shard
+    # screens and ranks its own hosts, so top_k picks the fastest hosts of every shard.
+    def __init__(self, shards=SHARDS, nodes=(), authkey=NODE_KEY,
+                 on_result=None, on_progress=None, on_error=None, on_tick=None, on_timing=None,
+                 negative_cache=None, probe_objects=None, metrics=None,
+                 max_workers=bdix_engine.MAX_WORKERS, **settings):
+        self.shards = max(0, shards)
+        self.nodes = list(nodes)
+        self.authkey = authkey.encode() if isinstance(authkey, str) else authkey
+        if self.nodes and not self.authkey:
+            raise ValueError("Remote shard nodes need a node key (set BDIX_NODE_KEY)")
+        self.on_result = on_result
+        self.on_progress = on_progress
+        self.on_error = on_error
+        self.on_tick = on_tick
+        self.on_timing = on_timing
+        self.negative_cache = negative_cache if negative_cache is not None else NegativeCache()
+        self.probe_objects = probe_objects if probe_objects is not None else {}
+        self.metrics = metrics if metrics is not None else ScanMetrics()
+        # Total concurrency stays what the caller asked for, divided over the shards
+        count = max(1, self.shards + len(self.nodes))
+        self.settings = dict(settings, max_workers=max(1, -(-max_workers // count)))
+        self.is_running = True
+
+    def emit_error(self, msg):
+        if self.on_error:
+            self.on_error(msg)
+
+    def stop(self):
+        logger.info("Stopping sharded scan")
+        self.is_running = False
+
+    def open_shards(self):
+        shards = []
+        context = multiprocessing.get_context('spawn')
+        for number in range(self.shards):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=shard_process, args=(child_conn,), daemon=True,
+                                      name=f"bdix-shard-{number}")
+            process.start()
+            child_conn.close()
+            shards.append(Shard(f"process {number}", parent_conn, process))
+        for node in self.nodes:
+            try:
+                shards.append(Shard(f"node {node}", Client(parse_address(node), authkey=self.authkey)))
+            except (OSError, ValueError, multiprocessing.AuthenticationError) as e:
+                msg = f"Could not connect to shard node {node}: {e}"
+                logger.error(msg)
+                self.emit_error(msg)
+
+        settings = dict(self.settings, backoff=self.negative_cache.entries, probe_objects=self.probe_objects)
+        level = logging.getLogger().getEffectiveLevel()
+        events = event_logger.isEnabledFor(logging.INFO)
+        for shard in shards:
+            self.send(shard, ('start', settings, level, events))
+        return shards
+
+    def run(self, urls, overrides=None, total=None):
+        overrides = overrides if overrides is not None else {}
+        sized = hasattr(urls, '__len__')
+        self.total_urls = total or (len(urls) if sized else 0)
+        self.completed = 0
+        self.ingested = 0
+        self.last_progress = -1
+        shards = self.open_shards()
+        if not shards:
+            raise RuntimeError("No shard could be started")
+        logger.debug(f"Starting sharded test over {len(shards)} shards "
+                     f"(max_workers={self.settings['max_workers']} per shard)")
+
+        source = iter(urls) if sized else None
+        feed = None if sized else URLFeed(urls)
+        exhausted = False
+        stopping_since = None
+        try:
+            while not all(shard.done for shard in shards):
+                if not self.is_running:
+                    if stopping_since is None:
+                        logger.info("Test stopped by user")
+                        stopping_since = time.monotonic()
+                        for shard in shards:
+                            self.send(shard, ('stop',))
+                    elif time.monotonic() - stopping_since > STOP_GRACE:
+                        break
+
+                # Read more input unless a shard is backed up; its busy hosts then pace the scan
+                room = all(len(shard.pending) < SHARD_BACKLOG for shard in shards if not shard.done)
+                reading = self.is_running and not exhausted and room
+                if reading:
+                    if feed:
+                        batch = feed.take(SHARD_BATCH)
+                        exhausted = feed.exhausted
+                    else:
+                        batch = list(islice(source, SHARD_BATCH))
+                        exhausted = len(batch) < SHARD_BATCH
+                    self.ingested += len(batch)
+                    for url in batch:
+                        shard = shards[shard_of(url, len(shards))]
+                        if not shard.done:
+                            shard.pending.append((url, overrides.get(url)))
+                if self.is_running:
+                    for shard in shards:
+                        if not shard.done:
+                            self.feed(shard, exhausted)
+
+                active = [shard.conn for shard in shards if not shard.done]
+                busy = reading and not exhausted and (len(batch) == SHARD_BATCH or not feed)
+                for conn in wait(active, timeout=0 if busy else TICK_INTERVAL):
+                    shard = next(shard for shard in shards if shard.conn is conn)
+                    self.receive(shard)
+
+                if self.on_tick:
+                    self.on_tick()
+        finally:
+            if feed:
+                feed.close()
+            for shard in shards:
+                shard.close()
+
+        if self.is_running and all(shard.lost for shard in shards):
+            raise RuntimeError("Every shard was lost before the scan finished")
+        if self.is_running:
+            logger.info("Test completed successfully")
+            if self.on_progress and self.last_progress != 100:
+                self.on_progress(100)
+
+    def send(self, shard, message):
+        try:
+            send_message(shard.conn, message)
+        except (OSError, EOFError) as e:
+            self.lost(shard, e)
+
+    def feed(self, shard, exhausted):
+        try:
+            shard.feed(exhausted)
+        except (OSError, EOFError) as e:
+            self.lost(shard, e)
+
+    def receive(self, shard):
+        while not shard.done:
+            try:
+                if not shard.conn.poll():
+                    return
+                message = recv_message(shard.conn)
+            except (OSError, EOFError) as e:
+                self.lost(shard, e)
+                return
+            kind = message[0]
+            if kind == 'results':
+                self.merge([ProbeResult(**result) for result in message[1]],
+                           [ProbeTiming(**timing) for timing in message[2]], message[3])
+            elif kind == 'ack':
+                shard.credits += 1
+            elif kind == 'log':
+                record = logging.makeLogRecord(message[1])
+                logging.getLogger(record.name).handle(record)
+            elif kind == 'error':
+                self.emit_error(message[1])
+            elif kind == 'done':
+                self.negative_cache.entries.update(as_tuples(message[1]))
+                self.probe_objects.update(as_tuples(message[2]))
+                shard.done = True
+
+    def merge(self, results, timings, dns):
+        for ms in dns:
+            self.metrics.observe_dns(ms)
+        for timing in timings:
+            self.metrics.record(timing)
+            if self.on_timing:
+                self.on_timing(timing)
+        if not self.is_running:
+            return
+        for result in results:
+            self.completed += 1
+            if self.on_result:
+                self.on_result(result)
+        if self.on_progress:
+            progress = min(100, self.completed * 100 // max(self.total_urls, self.ingested, 1))
+            if progress != self.last_progress:
+                self.last_progress = progress
+                self.on_progress(progress)
+
+    def lost(self, shard, error):
+        if shard.done:
+            return
+        shard.done = shard.lost = True
+        if self.is_running:
+            msg = f"Lost shard {shard.name}: {error or 'connection closed'}"
+            logger.error(msg)
+            self.emit_error(msg)
+
+def serve(address=NODE_ADDRESS, authkey=NODE_KEY):
+    # Serves one shard at a time; start one per core to use a whole machine
+    authkey = authkey.encode() if isinstance(authkey, str) else authkey
+    if not authkey:
+        raise ValueError("A node key is required (set BDIX_NODE_KEY or pass --authkey)")
+    with Listener(parse_address(address), authkey=authkey) as listener:
+        logger.info(f"Serving shards on {address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+                logger.warning(f"Rejected shard connection: {e}")
+                continue
+            logger.info(f"Shard connection from {listener.last_accepted}")
+            try:
+                serve_shard(conn)
+            except (OSError, EOFError) as e:
+                logger.warning(f"Shard connection lost: {e}")
+            finally:
+                conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="BDIX Speed Test - remote shard node")
+    parser.add_argument('address', nargs='?', default=NODE_ADDRESS,
+                        help="HOST:PORT to listen on (default: %(default)s; use the LAN address "
+                             "to accept coordinators on other machines)")
+    parser.add_argument('--authkey', default=NODE_KEY,
+                        help="Shared secret the coordinator must present (required; default: $BDIX_NODE_KEY)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    try:
+        serve(args.address, args.authkey)
+    except ValueError as e:
+        logger.error(str(e))
+        return 2
+    except KeyboardInterrupt:
+        return 130
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
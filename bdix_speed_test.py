@@ -1,537 +1,793 @@
-import sys
-import os
-import requests
-import time
-import webbrowser
-import logging
-import traceback
-from ping3 import ping, errors
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QLabel, QVBoxLayout, 
-                             QHBoxLayout, QWidget, QFileDialog, QProgressBar, QTableWidget, 
-                             QTableWidgetItem, QStatusBar, QMessageBox, QHeaderView)
-from PyQt5.QtGui import QIcon, QColor, QFont
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer
-from openpyxl import Workbook
-
-# ---------------- Enhanced Logging Setup ----------------
-def setup_logging():
-    logging.basicConfig(
-        filename="speed_test.log",
-        level=logging.DEBUG,  # Changed to DEBUG for more detailed logs
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
-    # Also log to console
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    formatter = logging.Formatter('%(levelname)s: %(message)s')
-    console_handler.setFormatter(formatter)
-    logging.getLogger().addHandler(console_handler)
-
-setup_logging()
-logger = logging.getLogger("BDIX Speed Test")
-
-class SpeedTestWorker(QThread):
-    update_signal = pyqtSignal(str, float, float)
-    progress_signal = pyqtSignal(int)
-    error_signal = pyqtSignal(str)
-    finished_signal = pyqtSignal()
-
-    def __init__(self, urls):
-        super().__init__()
-        self.urls = urls
-        self.is_running = True
-        logger.info(f"Worker initialized with {len(urls)} URLs")
-
-    def run(self):
-        try:
-            total_urls = len(self.urls)
-            logger.debug(f"Starting test with {total_urls} URLs")
-            
-            for index, url in enumerate(self.urls):
-                if not self.is_running:
-                    logger.info("Test stopped by user")
-                    break
-
-                try:
-                    logger.debug(f"Testing URL {index+1}/{total_urls}: {url}")
-                    ping_time = self.test_ping(url)
-                    if ping_time is None or ping_time is False:
-                        ping_time = -1
-                        logger.warning(f"Ping test failed for {url}")
-
-                    download_speed = self.test_download_speed(url)
-                    logger.debug(f"Results for {url}: Ping={ping_time}, Speed={download_speed}")
-                    self.update_signal.emit(url, ping_time, download_speed)
-                except Exception as e:
-                    msg = f"Error testing {url}: {str(e)}"
-                    logger.error(msg, exc_info=True)
-                    self.error_signal.emit(msg)
-
-                progress = int(((index + 1) / total_urls) * 100)
-                self.progress_signal.emit(progress)
-
-            logger.info("Test completed successfully")
-
-        except Exception as e:
-            msg = f"Worker crashed: {str(e)}"
-            logger.critical(msg, exc_info=True)
-            self.error_signal.emit(msg)
-        finally:
-            self.finished_signal.emit()
-
-    def stop(self):
-        logger.info("Stopping worker")
-        self.is_running = False
-
-    def test_ping(self, url):
-        try:
-            # Extract hostname from URL
-            if '://' in url:
-                hostname = url.split('://')[1].split('/')[0]
-            else:
-                hostname = url.split('/')[0]
-                
-            # Handle port if present
-            if ':' in hostname:
-                hostname = hostname.split(':')[0]
-                
-            logger.debug(f"Pinging hostname: {hostname}")
-            result = ping(hostname, unit='ms', timeout=2)
-            return result
-        except errors.PingError as e:
-            logger.warning(f"Ping error for {url}: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Unexpected ping error for {url}: {e}")
-            return None
-
-    def test_download_speed(self, url):
-        try:
-            logger.debug(f"Testing download speed for {url}")
-            start_time = time.time()
-            response = requests.get(url, stream=True, timeout=10)
-            response.raise_for_status()
-
-            content = b""
-            content_size = 0
-            for chunk in response.iter_content(chunk_size=8192):
-                if not self.is_running:
-                    logger.debug("Download test stopped by user")
-                    return 0
-                    
-                content += chunk
-                content_size += len(chunk)
-                if content_size >= 102400:  # 100KB
-                    break
-
-            elapsed_time = time.time() - start_time
-            if elapsed_time < 0.001:
-                elapsed_time = 0.001
-
-            speed = (content_size * 8) / (elapsed_time * 1_000_000)  # Mbps
-            logger.debug(f"Download speed for {url}: {speed:.2f} Mbps")
-            return speed
-            
-        except requests.RequestException as e:
-            msg = f"Request error for {url}: {str(e)}"
-            logger.warning(msg)
-            self.error_signal.emit(msg)
-            return 0
-        except Exception as e:
-            msg = f"Download test error for {url}: {str(e)}"
-            logger.error(msg, exc_info=True)
-            self.error_signal.emit(msg)
-            return 0
-
-class SpeedTestApp(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        logger.info("Initializing application")
-        try:
-            self.init_ui()
-            self.urls = []
-            self.worker = None
-            logger.info("Application initialized successfully")
-        except Exception as e:
-            logger.critical(f"Failed to initialize application: {e}", exc_info=True)
-            raise
-
-    def init_ui(self):
-        self.setWindowTitle("BDIX Speed Test By SAHimu")
-        self.setWindowIcon(self.get_icon())
-        self.setGeometry(300, 100, 900, 700)
-
-        # Set application style
-        self.setStyleSheet("""
-            QMainWindow {
-                background-color: #2d2d2d;
-            }
-            QLabel {
-                color: #ffffff;
-                font-size: 14px;
-            }
-            QStatusBar {
-                color: #ffffff;
-                background-color: #3d3d3d;
-            }
-        """)
-
-        self.central_widget = QWidget()
-        self.setCentralWidget(self.central_widget)
-        self.layout = QVBoxLayout(self.central_widget)
-
-        # Title label
-        self.title_label = QLabel("BDIX Speed Test - Select a file containing URLs")
-        self.title_label.setAlignment(Qt.AlignCenter)
-        self.title_label.setStyleSheet("font-size: 16px; font-weight: bold; padding: 10px; color: #ffffff;")
-        self.layout.addWidget(self.title_label)
-
-        # Button layout
-        self.button_layout = QHBoxLayout()
-        
-        self.file_button = QPushButton("Choose File")
-        self.file_button.setToolTip("Select a text file containing URLs for testing.")
-        self.file_button.setFixedSize(120, 40)
-        self.file_button.setStyleSheet(self.get_button_style('#007bff', '#0056b3', '#004494'))
-        self.file_button.clicked.connect(self.open_file_dialog)
-        self.button_layout.addWidget(self.file_button)
-
-        self.start_button = QPushButton("Start Test")
-        self.start_button.setEnabled(False)
-        self.start_button.setFixedSize(120, 40)
-        self.start_button.setStyleSheet(self.get_button_style('#28a745', '#218838', '#1e7e34'))
-        self.start_button.clicked.connect(self.start_test)
-        self.button_layout.addWidget(self.start_button)
-
-        self.stop_button = QPushButton("Stop Test")
-        self.stop_button.setEnabled(False)
-        self.stop_button.setFixedSize(120, 40)
-        self.stop_button.setStyleSheet(self.get_button_style('#dc3545', '#c82333', '#bd2130'))
-        self.stop_button.clicked.connect(self.stop_test)
-        self.button_layout.addWidget(self.stop_button)
-
-        self.save_button = QPushButton("Save Results")
-        self.save_button.setEnabled(False)
-        self.save_button.setFixedSize(120, 40)
-        self.save_button.setStyleSheet(self.get_button_style('#6c757d', '#5a6268', '#545b62'))
-        self.save_button.clicked.connect(self.save_results)
-        self.button_layout.addWidget(self.save_button)
-
-        self.layout.addLayout(self.button_layout)
-
-        # Progress bar
-        self.progress_bar = QProgressBar()
-        self.progress_bar.setAlignment(Qt.AlignCenter)
-        self.progress_bar.setStyleSheet(self.get_progress_bar_style())
-        self.progress_bar.setTextVisible(True)
-        self.layout.addWidget(self.progress_bar)
-
-        # Results table
-        self.result_table = QTableWidget()
-        self.result_table.setColumnCount(4)
-        self.result_table.setHorizontalHeaderLabels(['No.', 'URL', 'Ping (ms)', 'Download Speed (Mbps)'])
-        self.result_table.setRowCount(0)
-        self.result_table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.result_table.cellClicked.connect(self.open_url_in_browser)
-        
-        # Set column widths
-        self.result_table.setColumnWidth(0, 50)   # No.
-        self.result_table.setColumnWidth(1, 400)  # URL
-        self.result_table.setColumnWidth(2, 100)  # Ping
-        self.result_table.setColumnWidth(3, 150)  # Speed
-        
-        # Enable sorting
-        self.result_table.setSortingEnabled(True)
-        
-        # Add styling
-        self.result_table.setStyleSheet("""
-            QTableWidget {
-                background-color: #2d2d2d;
-                color: #ffffff;
-                gridline-color: #555;
-                border: 1px solid #444;
-                alternate-background-color: #333;
-            }
-            QTableWidget::item {
-                padding: 5px;
-                border-bottom: 1px solid #444;
-            }
-            QTableWidget::item:selected {
-                background-color: #4CAF50;
-                color: white;
-            }
-            QTableWidget::item:hover {
-                background-color: #3d3d3d;
-            }
-            QHeaderView::section {
-                background-color: #444;
-                padding: 5px;
-                border: none;
-                font-weight: bold;
-                color: white;
-            }
-        """)
-        
-        self.layout.addWidget(self.result_table)
-
-        # Status bar
-        self.status_bar = QStatusBar()
-        self.setStatusBar(self.status_bar)
-        self.status_bar.showMessage("Ready")
-
-    def get_icon(self):
-        try:
-            if os.path.exists('icon.png'):
-                return QIcon('icon.png')
-            else:
-                # Create a simple default icon
-                from PyQt5.QtGui import QPixmap, QPainter
-                pixmap = QPixmap(32, 32)
-                pixmap.fill(QColor(53, 53, 53))
-                painter = QPainter(pixmap)
-                painter.setPen(QColor(255, 255, 255))
-                painter.drawText(pixmap.rect(), Qt.AlignCenter, "ST")
-                painter.end()
-                return QIcon(pixmap)
-        except Exception as e:
-            logger.warning(f"Could not create icon: {e}")
-            return QIcon()
-
-    def get_button_style(self, bg_color, hover_color, press_color):
-        return f"""
-            QPushButton {{
-                background-color: {bg_color};
-                color: white;
-                font-size: 14px;
-                font-weight: bold;
-                border: none;
-                padding: 8px 16px;
-                border-radius: 5px;
-            }}
-            QPushButton:hover {{
-                background-color: {hover_color};
-            }}
-            QPushButton:pressed {{
-                background-color: {press_color};
-            }}
-            QPushButton:disabled {{
-                background-color: #6c757d;
-                color: #ccc;
-            }}
-        """
-
-    def get_progress_bar_style(self):
-        return """
-            QProgressBar {
-                background-color: #2c2f33;
-                border-radius: 10px;
-                height: 25px;
-                text-align: center;
-                color: white;
-                font-weight: bold;
-            }
-            QProgressBar::chunk {
-                background-color: #28a745;
-                border-radius: 10px;
-            }
-        """
-
-    def open_file_dialog(self):
-        try:
-            file_dialog = QFileDialog()
-            file_path, _ = file_dialog.getOpenFileName(self, "Open URL File", "", "Text Files (*.txt)")
-            if file_path:
-                logger.info(f"Opening file: {file_path}")
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    self.urls = [line.strip() for line in file if line.strip()]
-                
-                if self.urls:
-                    self.start_button.setEnabled(True)
-                    self.status_bar.showMessage(f"Loaded {len(self.urls)} URLs from {file_path}")
-                    logger.info(f"Loaded {len(self.urls)} URLs from {file_path}")
-                else:
-                    self.status_bar.showMessage("No valid URLs found in the file")
-                    logger.warning("No valid URLs found in the file")
-                    QMessageBox.warning(self, "No URLs", "The selected file doesn't contain any valid URLs.")
-        except Exception as e:
-            msg = f"Failed to read file: {str(e)}"
-            logger.error(msg, exc_info=True)
-            QMessageBox.critical(self, "Error", msg)
-
-    def start_test(self):
-        try:
-            logger.info("Starting speed test")
-            self.result_table.setRowCount(0)
-            self.progress_bar.setValue(0)
-            self.progress_bar.setFormat("Starting test...")
-
-            if self.urls:
-                self.worker = SpeedTestWorker(self.urls)
-                self.worker.update_signal.connect(self.display_results)
-                self.worker.progress_signal.connect(self.update_progress)
-                self.worker.error_signal.connect(self.handle_error)
-                self.worker.finished_signal.connect(self.on_test_complete)
-                self.worker.start()
-                
-                self.start_button.setEnabled(False)
-                self.stop_button.setEnabled(True)
-                self.save_button.setEnabled(False)
-                self.status_bar.showMessage("Testing in progress...")
-        except Exception as e:
-            msg = f"Failed to start test: {str(e)}"
-            logger.error(msg, exc_info=True)
-            QMessageBox.critical(self, "Error", msg)
-            self.start_button.setEnabled(True)
-
-    def stop_test(self):
-        try:
-            if self.worker and self.worker.isRunning():
-                logger.info("Stopping test")
-                self.worker.stop()
-                self.worker.wait()
-                self.status_bar.showMessage("Test stopped by user")
-                self.on_test_complete()
-        except Exception as e:
-            logger.error(f"Error stopping test: {e}", exc_info=True)
-
-    def handle_error(self, error_msg):
-        self.status_bar.showMessage(error_msg)
-        logger.error(error_msg)
-
-    def display_results(self, url, ping_time, download_speed):
-        try:
-            row_position = self.result_table.rowCount()
-            self.result_table.insertRow(row_position)
-            
-            # Format values
-            ping_display = round(ping_time, 2) if isinstance(ping_time, (int, float)) and ping_time >= 0 else "Error"
-            speed_display = round(download_speed, 2) if isinstance(download_speed, (int, float)) and download_speed >= 0 else "Error"
-            
-            # Add items to table
-            self.result_table.setItem(row_position, 0, QTableWidgetItem(str(row_position + 1)))
-            self.result_table.setItem(row_position, 1, QTableWidgetItem(url))
-            self.result_table.setItem(row_position, 2, QTableWidgetItem(str(ping_display)))
-            self.result_table.setItem(row_position, 3, QTableWidgetItem(str(speed_display)))
-            
-            # Color code based on performance
-            if ping_time != -1 and isinstance(ping_time, (int, float)):
-                ping_item = self.result_table.item(row_position, 2)
-                if ping_time < 100:  # Good ping
-                    ping_item.setBackground(QColor(0, 100, 0))
-                elif ping_time < 200:  # Average ping
-                    ping_item.setBackground(QColor(200, 100, 0))
-                else:  # Poor ping
-                    ping_item.setBackground(QColor(150, 0, 0))
-            
-            if download_speed and isinstance(download_speed, (int, float)):
-                speed_item = self.result_table.item(row_position, 3)
-                if download_speed > 10:  # Good speed
-                    speed_item.setBackground(QColor(0, 100, 0))
-                elif download_speed > 5:  # Average speed
-                    speed_item.setBackground(QColor(200, 100, 0))
-                else:  # Poor speed
-                    speed_item.setBackground(QColor(150, 0, 0))
-        except Exception as e:
-            msg = f"Error displaying results: {str(e)}"
-            self.status_bar.showMessage(msg)
-            logger.error(msg, exc_info=True)
-    
-    def update_progress(self, progress):
-        self.progress_bar.setValue(progress)
-        self.progress_bar.setFormat(f"Testing... {progress}%")
-
-    def on_test_complete(self):
-        self.start_button.setEnabled(True)
-        self.stop_button.setEnabled(False)
-        self.save_button.setEnabled(True)
-        self.progress_bar.setFormat("Test Complete")
-        self.status_bar.showMessage("Test completed successfully")
-        
-        # Ask if user wants to save results
-        QTimer.singleShot(1000, self.save_results_popup)
-
-    def save_results_popup(self):
-        if self.result_table.rowCount() > 0:
-            reply = QMessageBox.question(self, "Test Completed", 
-                                        "Do you want to save the results to an Excel file?", 
-                                        QMessageBox.Yes | QMessageBox.No)
-            if reply == QMessageBox.Yes:
-                self.save_results()
-
-    def save_results(self):
-        try:
-            options = QFileDialog.Options()
-            file_path, _ = QFileDialog.getSaveFileName(self, "Save Results", "speed_test_results", "Excel Files (*.xlsx)", options=options)
-            if file_path:
-                logger.info(f"Saving results to: {file_path}")
-                wb = Workbook()
-                ws = wb.active
-                ws.title = "Speed Test Results"
-                ws.append(['No.', 'URL', 'Ping (ms)', 'Download Speed (Mbps)'])
-
-                for row in range(self.result_table.rowCount()):
-                    row_data = []
-                    for col in range(self.result_table.columnCount()):
-                        item = self.result_table.item(row, col)
-                        row_data.append(item.text() if item else "")
-                    ws.append(row_data)
-
-                wb.save(file_path)
-                self.status_bar.showMessage(f"Results saved to {file_path}")
-                logger.info(f"Results saved successfully to {file_path}")
-        except Exception as e:
-            msg = f"Failed to save results: {str(e)}"
-            logger.error(msg, exc_info=True)
-            QMessageBox.critical(self, "Error", msg)
-
-    def open_url_in_browser(self, row, column):
-        try:
-            if column == 1:
-                url_item = self.result_table.item(row, 1)
-                if url_item:
-                    url = url_item.text()
-                    logger.info(f"Opening URL in browser: {url}")
-                    webbrowser.open(url)
-        except Exception as e:
-            logger.error(f"Error opening URL in browser: {e}", exc_info=True)
-
-    def closeEvent(self, event):
-        try:
-            if self.worker and self.worker.isRunning():
-                logger.info("Stopping worker on application close")
-                self.worker.stop()
-                self.worker.wait()
-        except Exception as e:
-            logger.error(f"Error during close event: {e}", exc_info=True)
-        finally:
-            logger.info("Application closing")
-            event.accept()
-
-def main():
-    try:
-        logger.info("Starting application")
-        app = QApplication(sys.argv)
-        app.setStyle('Fusion')
-        
-        window = SpeedTestApp()
-        window.show()
-        
-        ret = app.exec_()
-        logger.info("Application exited normally")
-        sys.exit(ret)
-    except Exception as e:
-        logger.critical(f"Application crashed: {e}\n{traceback.format_exc()}")
-        # Try to show error message if possible
-        try:
-            error_box = QMessageBox()
-            error_box.setIcon(QMessageBox.Critical)
-            error_box.setText("Application Error")
-            error_box.setInformativeText(str(e))
-            error_box.exec_()
-        except:
-            pass
-        sys.exit(1)
-
-if __name__ == '__main__':
+import sys
+import os
+import multiprocessing
+import webbrowser
+import logging
+import time
+import threading
+import traceback
+from itertools import islice
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QLabel, QVBoxLayout, 
+                             QHBoxLayout, QWidget, QFileDialog, QProgressBar, QTableView, 
+                             QLineEdit, QCheckBox, QStatusBar, QMessageBox, QHeaderView)
+from PyQt5.QtGui import QIcon, QColor, QFont
+from PyQt5.QtCore import (Qt, QThread, pyqtSignal, QTimer, QAbstractTableModel, QModelIndex,
+                          QSortFilterProxyModel)
+from bdix_engine import SpeedTestEngine, NegativeCache
+from bdix_ingest import URLIngest
+from bdix_shard import ShardedScan, SHARDS
+import numpy as np
+from bdix_store import ResultStore, RANKING_FIELDS, GOOD, AVERAGE, POOR
+from bdix_export import export_results, RANKING_HEADERS
+from bdix_history import ResultHistory, HISTORY_DB, HISTORY_TTL, RANKING_WINDOW, QUERY_CHUNK
+from bdix_logging import setup_logging, LOG_LEVEL, EVENT_LOG
+
+# ---------------- Enhanced Logging Setup ----------------
+logger = logging.getLogger("BDIX Speed Test")
+
+BATCH_INTERVAL = 0.25  # Seconds between result batches sent to the table
+
+class SpeedTestWorker(QThread):
+    results_signal = pyqtSignal(list)
+    progress_signal = pyqtSignal(int)
+    error_signal = pyqtSignal(str)
+    finished_signal = pyqtSignal()
+
+    def __init__(self, sources, incremental=False, batch_interval=BATCH_INTERVAL, history=None, shards=0,
+                 **settings):
+        super().__init__()
+        self.ingest = URLIngest(sources)
+        self.incremental = incremental
+        self.batch_interval = batch_interval
+        self.history = history
+        self.pending = []
+        self.cached = []  # Fresh history results shown without re-recording them
+        self.cached_lock = threading.Lock()  # Cached results arrive on the engine's input reader thread
+        self.last_flush = 0
+        # With shards the probing runs in worker processes and this thread only merges results
+        scanner = ShardedScan if shards else SpeedTestEngine
+        if shards:
+            settings['shards'] = shards
+        self.engine = scanner(on_result=self.emit_result,
+                              on_progress=self.progress_signal.emit,
+                              on_error=self.error_signal.emit,
+                              on_tick=self.flush_results,
+                              **settings)
+        logger.info(f"Worker initialized with {len(sources)} URL files")
+
+    def run(self):
+        try:
+            # URLs are read while the engine probes; counting lines first only sizes the progress bar
+            total = self.ingest.count_lines()
+            urls = self.ingest
+            if self.history and self.incremental:
+                urls = self.history.iter_stale(self.ingest, HISTORY_TTL, on_fresh=self.emit_cached)
+            self.engine.run(urls, self.ingest.overrides, total=total)
+        except Exception as e:
+            msg = f"Worker crashed: {str(e)}"
+            logger.critical(msg, exc_info=True)
+            self.error_signal.emit(msg)
+        finally:
+            self.flush_results(force=True)
+            if self.history:
+                try:
+                    self.history.save_backoff(self.engine.negative_cache.entries)
+                    self.history.save_probe_objects(self.engine.probe_objects)
+                except Exception as e:
+                    logger.error(f"Failed to save host state: {e}", exc_info=True)
+            self.finished_signal.emit()
+
+    def emit_result(self, result):
+        # Results are collected and handed to the GUI in timed batches
+        self.pending.append(result)
+        self.flush_results()
+
+    def emit_cached(self, result):
+        # Shown with the next batch the engine thread flushes
+        with self.cached_lock:
+            self.cached.append(result)
+
+    def flush_results(self, force=False):
+        now = time.monotonic()
+        if (self.pending or self.cached) and (force or now - self.last_flush >= self.batch_interval):
+            with self.cached_lock:
+                cached, self.cached = self.cached, []
+            results = cached + self.pending
+            if self.history:
+                try:
+                    if self.pending:
+                        self.history.record(self.pending)
+                    # The table ranks every run of a URL within the window, this one included
+                    results = list(self.history.iter_samples([result.url for result in results],
+                                                             time.time() - RANKING_WINDOW))
+                except Exception as e:
+                    logger.error(f"Failed to record results in history: {e}", exc_info=True)
+            self.results_signal.emit(results)
+            self.pending = []
+            self.last_flush = now
+
+    def stop(self):
+        logger.info("Stopping worker")
+        self.engine.stop()
+
+class CacheLoader(QThread):
+    # Fills the table from the history while a newly opened list is read in the background
+    results_signal = pyqtSignal(list)
+
+    def __init__(self, sources, history, batch_interval=BATCH_INTERVAL):
+        super().__init__()
+        self.sources = sources
+        self.history = history
+        self.batch_interval = batch_interval
+        self.is_running = True
+
+    def run(self):
+        try:
+            urls = iter(URLIngest(self.sources))
+            since = time.time() - RANKING_WINDOW
+            pending = []
+            last_flush = time.monotonic()
+            while self.is_running:
+                chunk = list(islice(urls, QUERY_CHUNK))
+                if not chunk:
+                    break
+                pending.extend(self.history.iter_samples(chunk, since))
+                if pending and time.monotonic() - last_flush >= self.batch_interval:
+                    self.results_signal.emit(pending)
+                    pending = []
+                    last_flush = time.monotonic()
+            if pending and self.is_running:
+                self.results_signal.emit(pending)
+        except Exception as e:
+            logger.error(f"Failed to load cached results: {e}", exc_info=True)
+
+    def stop(self):
+        self.is_running = False
+
+class ExportWorker(QThread):
+    finished_signal = pyqtSignal(str, int)
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, store, rows, file_path, fmt):
+        super().__init__()
+        self.store = store
+        self.rows = rows
+        self.file_path = file_path
+        self.fmt = fmt
+
+    def run(self):
+        try:
+            results = (self.store.row(row) for row in self.rows)
+            count = export_results(results, self.file_path, self.fmt,
+                                   fields=RANKING_FIELDS, headers=RANKING_HEADERS)
+            self.finished_signal.emit(self.file_path, count)
+        except Exception as e:
+            msg = f"Failed to save results: {str(e)}"
+            logger.error(msg, exc_info=True)
+            self.error_signal.emit(msg)
+
+class ResultTableModel(QAbstractTableModel):
+    # One row per URL showing its runs aggregated by the store; sorting is done here with
+    # NumPy because re-sorting through Python data() calls is too slow for large tables
+    HEADERS = ['Rank', 'URL', 'Ping (ms)', 'Download Speed (Mbps)', 'TTFB (ms)', 'Runs', 'Score']
+
+    BAND_COLORS = {
+        GOOD: QColor(0, 100, 0),
+        AVERAGE: QColor(200, 100, 0),
+        POOR: QColor(150, 0, 0),
+    }
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.order = np.arange(0)  # table row -> store row
+        self.sort_column = 0
+        self.sort_order = Qt.AscendingOrder
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def store_row(self, row):
+        return int(self.order[row])
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = self.store_row(index.row()), index.column()
+        store = self.store
+
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return str(store.rank[row])
+            if column == 1:
+                return store.urls[row]
+            if column == 5:
+                return str(store.runs[row])
+            if column == 6:
+                return f"{store.score[row]:.1f}"
+            value = float((store.ping, store.speed, store.ttfb)[column - 2][row])
+            return str(round(value, 2)) if value >= 0 else "Error"
+
+        if role == Qt.BackgroundRole:
+            # Bands are computed for every row by the store when it aggregates
+            bands = {2: store.ping_band, 3: store.speed_band, 6: store.score_band}.get(column)
+            if bands is not None:
+                return self.BAND_COLORS.get(int(bands[row]))
+
+        if role == Qt.ToolTipRole:
+            if column == 2 and store.ping[row] >= 0:
+                return (f"p95: {store.ping_p95[row]:.2f} ms, Jitter: {store.jitter[row]:.2f} ms, "
+                        f"Loss: {store.loss[row]:.0f}%")
+            if column == 3 and store.speed[row] > 0:
+                tip = f"p10: {store.speed_p10[row]:.2f} Mbps, Peak: {store.peak[row]:.2f} Mbps"
+                if store.stability[row] >= 0:
+                    tip += f", Stability: {store.stability[row]:.2f}"
+                return tip
+            if column == 4 and store.ttfb[row] >= 0:
+                return f"p95: {store.ttfb_p95[row]:.2f} ms"
+            if column == 5:
+                return f"Failed: {store.failed[row]:.0f}% of runs"
+        return None
+
+    def sort_key(self, column):
+        store = self.store
+        if column == 1:
+            return np.array(store.urls)
+        key = (store.rank, None, store.ping, store.speed, store.ttfb, store.runs, store.score)[column]
+        if column in (2, 4):
+            # Failed probes sort after every real measurement
+            key = np.where(key < 0, np.inf, key)
+        return key
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column = column
+        self.sort_order = order
+        self.resort()
+
+    def resort(self):
+        self.layoutAboutToBeChanged.emit()
+        previous = self.order
+        order = np.argsort(self.sort_key(self.sort_column), kind='stable')
+        self.order = order[::-1] if self.sort_order == Qt.DescendingOrder else order
+        position = np.empty(len(self.order), dtype=np.int64)
+        position[self.order] = np.arange(len(self.order))
+        indexes = self.persistentIndexList()
+        self.changePersistentIndexList(
+            indexes, [self.index(int(position[previous[index.row()]]), index.column()) for index in indexes])
+        self.layoutChanged.emit()
+
+    def update_results(self, results):
+        # Every result is one more run of its URL; the whole table is re-ranked and re-sorted
+        first = len(self.order)
+        self.store.add(results)
+        self.store.aggregate()
+        if first:
+            self.dataChanged.emit(self.index(0, 0), self.index(first - 1, len(self.HEADERS) - 1))
+        last = len(self.store)
+        if last > first:
+            self.beginInsertRows(QModelIndex(), first, last - 1)
+            self.order = np.concatenate((self.order, np.arange(first, last)))
+            self.endInsertRows()
+        self.resort()
+
+    def clear(self):
+        self.beginResetModel()
+        self.store.clear()
+        self.order = np.arange(0)
+        self.endResetModel()
+
+class ResultFilterModel(QSortFilterProxyModel):
+    # Filters by URL only; sorting is handed to the source model
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sourceModel().sort(column, order)
+
+class SpeedTestApp(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        logger.info("Initializing application")
+        try:
+            self.init_ui()
+            self.sources = []
+            self.worker = None
+            self.export_worker = None
+            self.cache_loader = None
+            self.cache_loaders = []  # Loaders still running, including replaced ones
+            self.closing = False
+            self.history = self.open_history()
+            self.negative_cache = NegativeCache(self.history.load_backoff() if self.history else None)
+            self.probe_objects = self.history.load_probe_objects() if self.history else {}
+            logger.info("Application initialized successfully")
+        except Exception as e:
+            logger.critical(f"Failed to initialize application: {e}", exc_info=True)
+            raise
+
+    def init_ui(self):
+        self.setWindowTitle("BDIX Speed Test By SAHimu")
+        self.setWindowIcon(self.get_icon())
+        self.setGeometry(300, 100, 900, 700)
+
+        # Set application style
+        self.setStyleSheet("""
+            QMainWindow {
+                background-color: #2d2d2d;
+            }
+            QLabel {
+                color: #ffffff;
+                font-size: 14px;
+            }
+            QStatusBar {
+                color: #ffffff;
+                background-color: #3d3d3d;
+            }
+        """)
+
+        self.central_widget = QWidget()
+        self.setCentralWidget(self.central_widget)
+        self.layout = QVBoxLayout(self.central_widget)
+
+        # Title label
+        self.title_label = QLabel("BDIX Speed Test - Select a file containing URLs")
+        self.title_label.setAlignment(Qt.AlignCenter)
+        self.title_label.setStyleSheet("font-size: 16px; font-weight: bold; padding: 10px; color: #ffffff;")
+        self.layout.addWidget(self.title_label)
+
+        # Button layout
+        self.button_layout = QHBoxLayout()
+        
+        self.file_button = QPushButton("Choose File")
+        self.file_button.setToolTip("Select a text file containing URLs for testing.")
+        self.file_button.setFixedSize(120, 40)
+        self.file_button.setStyleSheet(self.get_button_style('#007bff', '#0056b3', '#004494'))
+        self.file_button.clicked.connect(self.open_file_dialog)
+        self.button_layout.addWidget(self.file_button)
+
+        self.start_button = QPushButton("Start Test")
+        self.start_button.setEnabled(False)
+        self.start_button.setFixedSize(120, 40)
+        self.start_button.setStyleSheet(self.get_button_style('#28a745', '#218838', '#1e7e34'))
+        self.start_button.clicked.connect(self.start_test)
+        self.button_layout.addWidget(self.start_button)
+
+        self.stop_button = QPushButton("Stop Test")
+        self.stop_button.setEnabled(False)
+        self.stop_button.setFixedSize(120, 40)
+        self.stop_button.setStyleSheet(self.get_button_style('#dc3545', '#c82333', '#bd2130'))
+        self.stop_button.clicked.connect(self.stop_test)
+        self.button_layout.addWidget(self.stop_button)
+
+        self.save_button = QPushButton("Save Results")
+        self.save_button.setEnabled(False)
+        self.save_button.setFixedSize(120, 40)
+        self.save_button.setStyleSheet(self.get_button_style('#6c757d', '#5a6268', '#545b62'))
+        self.save_button.clicked.connect(self.save_results)
+        self.button_layout.addWidget(self.save_button)
+
+        self.layout.addLayout(self.button_layout)
+
+        self.incremental_checkbox = QCheckBox("Only re-test stale, failed or new URLs")
+        self.incremental_checkbox.setToolTip(
+            f"Keep cached results newer than {HISTORY_TTL // 3600} hours and only test the rest.")
+        self.incremental_checkbox.setStyleSheet("color: #ffffff;")
+        self.layout.addWidget(self.incremental_checkbox)
+
+        self.range_checkbox = QCheckBox("Measure a large file on each server (HTTP Range)")
+        self.range_checkbox.setToolTip(
+            "Look for a large file linked from each server's pages and download a fixed "
+            "window of it instead of the listed URL.")
+        self.range_checkbox.setStyleSheet("color: #ffffff;")
+        self.layout.addWidget(self.range_checkbox)
+
+        self.shards_checkbox = QCheckBox(f"Use all CPU cores ({SHARDS} worker processes)")
+        self.shards_checkbox.setToolTip(
+            "Split very large URL lists over one probing process per core.")
+        self.shards_checkbox.setStyleSheet("color: #ffffff;")
+        self.shards_checkbox.setEnabled(SHARDS > 1)
+        self.layout.addWidget(self.shards_checkbox)
+
+        # Progress bar
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setAlignment(Qt.AlignCenter)
+        self.progress_bar.setStyleSheet(self.get_progress_bar_style())
+        self.progress_bar.setTextVisible(True)
+        self.layout.addWidget(self.progress_bar)
+
+        # URL filter
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("Filter URLs...")
+        self.filter_input.setClearButtonEnabled(True)
+        self.filter_input.setStyleSheet("""
+            QLineEdit {
+                background-color: #2d2d2d;
+                color: #ffffff;
+                border: 1px solid #444;
+                padding: 5px;
+            }
+        """)
+        self.layout.addWidget(self.filter_input)
+
+        # Results table backed by a compact result store
+        self.result_store = ResultStore()
+        self.result_model = ResultTableModel(self.result_store, self)
+        self.proxy_model = ResultFilterModel(self)
+        self.proxy_model.setSourceModel(self.result_model)
+        # URLs never change once added, so rows only need filtering when they are inserted
+        self.proxy_model.setDynamicSortFilter(False)
+        self.proxy_model.setFilterKeyColumn(1)
+        self.proxy_model.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.filter_input.textChanged.connect(self.proxy_model.setFilterFixedString)
+
+        self.result_table = QTableView()
+        self.result_table.setModel(self.proxy_model)
+        self.result_table.setEditTriggers(QTableView.NoEditTriggers)
+        self.result_table.clicked.connect(self.open_url_in_browser)
+        
+        # Set column widths
+        self.result_table.setColumnWidth(0, 50)   # Rank
+        self.result_table.setColumnWidth(1, 400)  # URL
+        self.result_table.setColumnWidth(2, 100)  # Ping
+        self.result_table.setColumnWidth(3, 150)  # Speed
+        self.result_table.setColumnWidth(4, 100)  # TTFB
+        self.result_table.setColumnWidth(5, 50)   # Runs
+        self.result_table.setColumnWidth(6, 60)   # Score
+        
+        # Enable sorting
+        self.result_table.setSortingEnabled(True)
+        self.result_table.sortByColumn(0, Qt.AscendingOrder)
+        
+        # Add styling
+        self.result_table.setStyleSheet("""
+            QTableView {
+                background-color: #2d2d2d;
+                color: #ffffff;
+                gridline-color: #555;
+                border: 1px solid #444;
+                alternate-background-color: #333;
+            }
+            QTableView::item {
+                padding: 5px;
+                border-bottom: 1px solid #444;
+            }
+            QTableView::item:selected {
+                background-color: #4CAF50;
+                color: white;
+            }
+            QTableView::item:hover {
+                background-color: #3d3d3d;
+            }
+            QHeaderView::section {
+                background-color: #444;
+                padding: 5px;
+                border: none;
+                font-weight: bold;
+                color: white;
+            }
+        """)
+        
+        self.layout.addWidget(self.result_table)
+
+        # Status bar
+        self.status_bar = QStatusBar()
+        self.setStatusBar(self.status_bar)
+        self.status_bar.showMessage("Ready")
+
+    def open_history(self):
+        try:
+            return ResultHistory(HISTORY_DB)
+        except Exception as e:
+            logger.error(f"Could not open result history {HISTORY_DB}: {e}", exc_info=True)
+            self.incremental_checkbox.setEnabled(False)
+            return None
+
+    def get_icon(self):
+        try:
+            if os.path.exists('icon.png'):
+                return QIcon('icon.png')
+            else:
+                # Create a simple default icon
+                from PyQt5.QtGui import QPixmap, QPainter
+                pixmap = QPixmap(32, 32)
+                pixmap.fill(QColor(53, 53, 53))
+                painter = QPainter(pixmap)
+                painter.setPen(QColor(255, 255, 255))
+                painter.drawText(pixmap.rect(), Qt.AlignCenter, "ST")
+                painter.end()
+                return QIcon(pixmap)
+        except Exception as e:
+            logger.warning(f"Could not create icon: {e}")
+            return QIcon()
+
+    def get_button_style(self, bg_color, hover_color, press_color):
+        return f"""
+            QPushButton {{
+                background-color: {bg_color};
+                color: white;
+                font-size: 14px;
+                font-weight: bold;
+                border: none;
+                padding: 8px 16px;
+                border-radius: 5px;
+            }}
+            QPushButton:hover {{
+                background-color: {hover_color};
+            }}
+            QPushButton:pressed {{
+                background-color: {press_color};
+            }}
+            QPushButton:disabled {{
+                background-color: #6c757d;
+                color: #ccc;
+            }}
+        """
+
+    def get_progress_bar_style(self):
+        return """
+            QProgressBar {
+                background-color: #2c2f33;
+                border-radius: 10px;
+                height: 25px;
+                text-align: center;
+                color: white;
+                font-weight: bold;
+            }
+            QProgressBar::chunk {
+                background-color: #28a745;
+                border-radius: 10px;
+            }
+        """
+
+    def open_file_dialog(self):
+        try:
+            if self.export_worker and self.export_worker.isRunning():
+                self.status_bar.showMessage("Results are still being saved...")
+                return
+            file_dialog = QFileDialog()
+            file_paths, _ = file_dialog.getOpenFileNames(self, "Open URL Files", "",
+                                                         "Text Files (*.txt);;All Files (*)")
+            if file_paths:
+                # Files are read in the background, so even huge lists open instantly
+                logger.info(f"Selected URL files: {', '.join(file_paths)}")
+                self.sources = file_paths
+                self.stop_cache_loader()
+                self.result_model.clear()
+                self.load_cached(file_paths)
+                self.start_button.setEnabled(True)
+                self.save_button.setEnabled(False)
+                names = os.path.basename(file_paths[0]) if len(file_paths) == 1 else f"{len(file_paths)} files"
+                self.status_bar.showMessage(f"Selected {names}")
+        except Exception as e:
+            msg = f"Failed to open files: {str(e)}"
+            logger.error(msg, exc_info=True)
+            QMessageBox.critical(self, "Error", msg)
+
+    def load_cached(self, sources):
+        # Earlier runs of the listed URLs show up before any test is started
+        if not self.history:
+            return
+        loader = CacheLoader(sources, self.history)
+        loader.results_signal.connect(lambda results: self.display_cached(loader, results))
+        loader.finished.connect(lambda: self.cache_loaders.remove(loader))
+        self.cache_loaders.append(loader)
+        self.cache_loader = loader
+        loader.start()
+
+    def display_cached(self, loader, results):
+        # A replaced loader may still have batches queued; those belong to another list
+        if loader is self.cache_loader:
+            self.display_results(results)
+
+    def stop_cache_loader(self):
+        if self.cache_loader:
+            self.cache_loader.stop()
+            self.cache_loader = None
+
+    def start_test(self):
+        try:
+            logger.info("Starting speed test")
+            incremental = bool(self.history) and self.incremental_checkbox.isChecked()
+            # Rows come back as results arrive, aggregated with the earlier runs kept in the history
+            self.stop_cache_loader()
+            self.result_model.clear()
+            self.progress_bar.setValue(0)
+            self.progress_bar.setFormat("Starting test...")
+
+            if self.sources:
+                self.worker = SpeedTestWorker(self.sources, incremental, history=self.history,
+                                              negative_cache=self.negative_cache,
+                                              range_probe=self.range_checkbox.isChecked(),
+                                              shards=SHARDS if self.shards_checkbox.isChecked() else 0,
+                                              probe_objects=self.probe_objects)
+                self.worker.results_signal.connect(self.display_results)
+                self.worker.progress_signal.connect(self.update_progress)
+                self.worker.error_signal.connect(self.handle_error)
+                self.worker.finished_signal.connect(self.on_test_complete)
+                self.worker.start()
+                
+                self.start_button.setEnabled(False)
+                self.stop_button.setEnabled(True)
+                self.save_button.setEnabled(False)
+                self.status_bar.showMessage("Testing in progress...")
+        except Exception as e:
+            msg = f"Failed to start test: {str(e)}"
+            logger.error(msg, exc_info=True)
+            QMessageBox.critical(self, "Error", msg)
+            self.start_button.setEnabled(True)
+
+    def stop_test(self):
+        try:
+            if self.worker and self.worker.isRunning():
+                # The worker winds down on its own; on_test_complete runs when it has
+                logger.info("Stopping test")
+                self.worker.stop()
+                self.stop_button.setEnabled(False)
+                self.status_bar.showMessage("Stopping test...")
+        except Exception as e:
+            logger.error(f"Error stopping test: {e}", exc_info=True)
+
+    def handle_error(self, error_msg):
+        self.status_bar.showMessage(error_msg)
+        logger.error(error_msg)
+
+    def display_results(self, results):
+        try:
+            self.result_model.update_results(results)
+        except Exception as e:
+            msg = f"Error displaying results: {str(e)}"
+            self.status_bar.showMessage(msg)
+            logger.error(msg, exc_info=True)
+
+    def update_progress(self, progress):
+        self.progress_bar.setValue(progress)
+        self.progress_bar.setFormat(f"Testing... {progress}%")
+
+    def on_test_complete(self):
+        self.start_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        self.save_button.setEnabled(True)
+        if self.closing:
+            return
+        if self.worker and not self.worker.engine.is_running:
+            self.progress_bar.setFormat("Test Stopped")
+            self.status_bar.showMessage("Test stopped by user")
+        elif self.worker and not self.worker.ingest.accepted:
+            self.progress_bar.setFormat("")
+            self.status_bar.showMessage("No valid URLs found in the selected files")
+            logger.warning("No valid URLs found in the selected files")
+            QMessageBox.warning(self, "No URLs", "The selected files don't contain any valid URLs.")
+            return
+        else:
+            self.progress_bar.setFormat("Test Complete")
+            self.status_bar.showMessage("Test completed successfully")
+        
+        # Ask if user wants to save results
+        QTimer.singleShot(1000, self.save_results_popup)
+
+    def save_results_popup(self):
+        if len(self.result_store) > 0 and not self.closing:
+            reply = QMessageBox.question(self, "Test Completed", 
+                                        "Do you want to save the results to an Excel file?", 
+                                        QMessageBox.Yes | QMessageBox.No)
+            if reply == QMessageBox.Yes:
+                self.save_results()
+
+    def save_results(self):
+        try:
+            if self.export_worker and self.export_worker.isRunning():
+                self.status_bar.showMessage("Results are still being saved...")
+                return
+
+            options = QFileDialog.Options()
+            file_path, selected_filter = QFileDialog.getSaveFileName(
+                self, "Save Results", "speed_test_results",
+                "Excel Files (*.xlsx);;CSV Files (*.csv);;JSON Lines (*.jsonl)", options=options)
+            if file_path:
+                fmt = {'CSV': 'csv', 'JSON': 'jsonl'}.get(selected_filter.split(' ')[0], 'xlsx')
+                if not os.path.splitext(file_path)[1]:
+                    file_path += '.' + fmt
+                logger.info(f"Saving results to: {file_path}")
+
+                # Rows are saved in the order and filter currently shown
+                rows = [self.result_model.store_row(
+                            self.proxy_model.mapToSource(self.proxy_model.index(row, 0)).row())
+                        for row in range(self.proxy_model.rowCount())]
+
+                # Writing happens off the GUI thread and reads the store as it goes, so Start
+                # and Choose File, which both clear the store, are blocked until it is done
+                self.export_worker = ExportWorker(self.result_store, rows, file_path, fmt)
+                self.export_worker.finished_signal.connect(self.on_results_saved)
+                self.export_worker.error_signal.connect(self.on_save_failed)
+                self.export_worker.start()
+                self.start_button.setEnabled(False)
+                self.file_button.setEnabled(False)
+                self.save_button.setEnabled(False)
+                self.status_bar.showMessage(f"Saving results to {file_path}...")
+        except Exception as e:
+            msg = f"Failed to save results: {str(e)}"
+            logger.error(msg, exc_info=True)
+            QMessageBox.critical(self, "Error", msg)
+
+    def on_results_saved(self, file_path, count):
+        self.start_button.setEnabled(bool(self.sources))
+        self.file_button.setEnabled(True)
+        self.save_button.setEnabled(True)
+        self.status_bar.showMessage(f"Results saved to {file_path}")
+        logger.info(f"Results saved successfully to {file_path} ({count} rows)")
+
+    def on_save_failed(self, msg):
+        self.start_button.setEnabled(bool(self.sources))
+        self.file_button.setEnabled(True)
+        self.save_button.setEnabled(True)
+        self.status_bar.showMessage(msg)
+        QMessageBox.critical(self, "Error", msg)
+
+    def open_url_in_browser(self, index):
+        try:
+            if index.column() == 1:
+                row = self.result_model.store_row(self.proxy_model.mapToSource(index).row())
+                url = self.result_store.urls[row]
+                logger.info(f"Opening URL in browser: {url}")
+                webbrowser.open(url)
+        except Exception as e:
+            logger.error(f"Error opening URL in browser: {e}", exc_info=True)
+
+    def closeEvent(self, event):
+        try:
+            self.stop_cache_loader()
+            busy = [worker for worker in [self.worker, self.export_worker] + self.cache_loaders
+                    if worker and worker.isRunning()]
+            if busy:
+                # Never block the GUI thread: stop the scan, let a save in progress
+                # finish so the file is not left half written, and close once both are done
+                if not self.closing:
+                    self.closing = True
+                    logger.info("Waiting for running work to finish before closing")
+                    if self.worker in busy:
+                        self.worker.stop()
+                    self.status_bar.showMessage("Closing...")
+                QTimer.singleShot(100, self.close)
+                event.ignore()
+                return
+        except Exception as e:
+            logger.error(f"Error during close event: {e}", exc_info=True)
+        if self.history:
+            self.history.close()
+        logger.info("Application closing")
+        event.accept()
+
+def main():
+    setup_logging(LOG_LEVEL, event_file=EVENT_LOG)
+    try:
+        logger.info("Starting application")
+        app = QApplication(sys.argv)
+        app.setStyle('Fusion')
+        
+        window = SpeedTestApp()
+        window.show()
+        
+        ret = app.exec_()
+        logger.info("Application exited normally")
+        sys.exit(ret)
+    except Exception as e:
+        logger.critical(f"Application crashed: {e}\n{traceback.format_exc()}")
+        # Try to show error message if possible
+        try:
+            error_box = QMessageBox()
+            error_box.setIcon(QMessageBox.Critical)
+            error_box.setText("Application Error")
+            error_box.setInformativeText(str(e))
+            error_box.exec_()
+        except:
+            pass
+        sys.exit(1)
+
+if __name__ == '__main__':
+    # Needed for the worker processes of a packaged executable
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,214 @@
+# ---------------- BDIX Result Store ----------------
+# Column-per-field storage for probe results that aggregates repeated runs of
+# the same URL. Every result is kept as a sample in NumPy arrays tagged with a
+# URL id, and aggregate() reduces them to per-URL percentiles, failure rate,
+# stability and a composite score in a few vectorized passes, so re-ranking
+# hundreds of thousands of samples takes milliseconds. Aggregates use -1 for
+# values that could not be measured, like single probe results do.
+import time
+from dataclasses import dataclass, asdict
+
+import numpy as np
+
+INITIAL_CAPACITY = 1024  # Samples allocated up front; storage doubles when full
+
+SAMPLE_COLUMNS = 6       # ping, jitter, loss, speed, ttfb, peak
+
+# Composite score: 0-100, reliability times a weighted mix of the components
+SPEED_REFERENCE = 10.0   # Median Mbps that earns half of the speed component
+PING_REFERENCE = 100.0   # Median ping in ms that earns half of the latency component
+SPEED_WEIGHT = 0.6
+LATENCY_WEIGHT = 0.25
+STABILITY_WEIGHT = 0.15
+LOSS_PENALTY = 0.5       # Share of the score lost at 100% ping loss
+UNKNOWN_STABILITY = 0.5  # Assumed until a URL has two successful runs
+
+# Colour bands
+GOOD, AVERAGE, POOR, UNRATED = 0, 1, 2, -1
+PING_BANDS = (100, 200)  # ms: good below the first, average below the second
+SPEED_BANDS = (5, 10)    # Mbps: average above the first, good above the second
+SCORE_BANDS = (30, 60)   # Score: average from the first, good from the second
+
+@dataclass
+class RankedResult:
+    rank: int
+    url: str
+    score: float
+    runs: int
+    failed: float     # % of runs that downloaded nothing
+    loss: float       # Mean ping loss in %
+    ping: float       # Median of the runs that got a ping reply
+    ping_p95: float
+    jitter: float
+    speed: float      # Median of the successful runs
+    speed_p10: float
+    peak: float
+    ttfb: float
+    ttfb_p95: float
+    stability: float  # 1 / (1 + coefficient of variation of the speed)
+
+    def as_dict(self):
+        return asdict(self)
+
+RANKING_FIELDS = ['rank', 'url', 'score', 'runs', 'failed', 'loss', 'ping', 'ping_p95', 'jitter',
+                  'speed', 'speed_p10', 'peak', 'ttfb', 'ttfb_p95', 'stability']
+
+def group_percentiles(ids, values, groups, quantiles):
+    # Per-group quantiles (0-1) with linear interpolation, one row per quantile; NaN for empty groups.
+    # One float sort on id + value scaled into [0, 0.5) orders by group and then value, several
+    # times faster than a two-key lexsort
+    if len(values):
+        low, high = values.min(), values.max()
+        values = values[np.argsort(ids + (values - low) / (2 * (high - low) + 1))]
+    counts = np.bincount(ids, minlength=groups)
+    starts = np.cumsum(counts) - counts
+    result = np.full((len(quantiles), groups), np.nan)
+    present = counts > 0
+    starts, counts = starts[present], counts[present]
+    for i, quantile in enumerate(quantiles):
+        position = starts + quantile * (counts - 1)
+        low = position.astype(np.int64)
+        high = np.minimum(low + 1, starts + counts - 1)
+        result[i, present] = values[low] + (values[high] - values[low]) * (position - low)
+    return result
+
+def measured(values):
+    return np.where(np.isnan(values), -1.0, values)
+
+class ResultStore:
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.initial_capacity = max(1, capacity)
+        self.clear()
+
+    def clear(self):
+        self.urls = []
+        self.index = {}  # url -> row (URL id)
+        self.size = 0    # Samples stored
+        self.url_ids = np.empty(self.initial_capacity, dtype=np.int32)
+        self.samples = np.empty((SAMPLE_COLUMNS, self.initial_capacity))
+        self.added_at = np.empty(self.initial_capacity)  # time.time() each sample was added
+        self.aggregate()
+
+    def __len__(self):
+        return len(self.urls)
+
+    def __iter__(self):
+        for row in np.argsort(self.rank, kind='stable'):
+            yield self.row(row)
+
+    def reserve(self, count):
+        capacity = len(self.url_ids)
+        if self.size + count <= capacity:
+            return
+        while capacity < self.size + count:
+            capacity *= 2
+        url_ids = np.empty(capacity, dtype=np.int32)
+        url_ids[:self.size] = self.url_ids[:self.size]
+        samples = np.empty((SAMPLE_COLUMNS, capacity))
+        samples[:, :self.size] = self.samples[:, :self.size]
+        added_at = np.empty(capacity)
+        added_at[:self.size] = self.added_at[:self.size]
+        self.url_ids, self.samples, self.added_at = url_ids, samples, added_at
+
+    def add(self, results, now=None):
+        # Returns the number of URLs seen for the first time; call aggregate() afterwards.
+        # URLs skipped by backoff or top-K were not probed and are left out of the ranking
+        results = [result for result in results if not result.skipped]
+        if not results:
+            return 0
+        first = len(self.urls)
+        ids = np.empty(len(results), dtype=np.int32)
+        for i, result in enumerate(results):
+            row = self.index.get(result.url)
+            if row is None:
+                row = self.index[result.url] = len(self.urls)
+                self.urls.append(result.url)
+            ids[i] = row
+        self.reserve(len(results))
+        end = self.size + len(results)
+        self.url_ids[self.size:end] = ids
+        self.samples[:, self.size:end] = np.array(
+            [(r.ping, r.jitter, r.loss, r.speed, r.ttfb, r.peak) for r in results], dtype=np.float64).T
+        self.added_at[self.size:end] = now or time.time()
+        self.size = end
+        return len(self.urls) - first
+
+    def drop_before(self, cutoff):
+        # Forgets samples added before cutoff and URLs left without any; call aggregate() afterwards
+        keep = self.added_at[:self.size] >= cutoff
+        if keep.all():
+            return
+        ids = self.url_ids[:self.size][keep]
+        kept_urls = np.unique(ids)
+        new_ids = np.empty(len(self.urls), dtype=np.int32)
+        new_ids[kept_urls] = np.arange(len(kept_urls))
+        self.urls = [self.urls[row] for row in kept_urls]
+        self.index = {url: row for row, url in enumerate(self.urls)}
+        size = len(ids)
+        self.url_ids[:size] = new_ids[ids]
+        self.samples[:, :size] = self.samples[:, :self.size][:, keep]
+        self.added_at[:size] = self.added_at[:self.size][keep]
+        self.size = size
+
+    def aggregate(self):
+        groups = len(self.urls)
+        ids = self.url_ids[:self.size]
+        ping, jitter, loss, speed, ttfb, peak = self.samples[:, :self.size]
+        replied = ping >= 0
+        ok = (ttfb >= 0) & (speed > 0)
+        ok_ids, ok_speed = ids[ok], speed[ok]
+
+        runs = np.bincount(ids, minlength=groups)
+        successes = np.bincount(ok_ids, minlength=groups)
+        replies = np.bincount(ids[replied], minlength=groups)
+        ping_p = group_percentiles(ids[replied], ping[replied], groups, (0.5, 0.95))
+        speed_p = group_percentiles(ok_ids, ok_speed, groups, (0.5, 0.1))
+        ttfb_p = group_percentiles(ok_ids, ttfb[ok], groups, (0.5, 0.95))
+        peak_max = np.full(groups, -1.0)
+        np.maximum.at(peak_max, ok_ids, peak[ok])
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            failed = 100 * (1 - successes / runs)
+            mean_loss = np.bincount(ids, weights=loss, minlength=groups) / runs
+            mean_jitter = np.bincount(ids[replied], weights=jitter[replied], minlength=groups) / replies
+            mean_speed = np.bincount(ok_ids, weights=ok_speed, minlength=groups) / successes
+            mean_square = np.bincount(ok_ids, weights=ok_speed ** 2, minlength=groups) / successes
+            spread = np.sqrt(np.maximum(mean_square - mean_speed ** 2, 0)) / mean_speed
+            stability = np.where(successes >= 2, 1 / (1 + spread), np.nan)
+
+            speed_part = np.nan_to_num(speed_p[0] / (speed_p[0] + SPEED_REFERENCE))
+            latency_part = np.nan_to_num(PING_REFERENCE / (PING_REFERENCE + ping_p[0]))
+        stability_part = np.where(np.isnan(stability), UNKNOWN_STABILITY, stability)
+        reliability = (1 - failed / 100) * (1 - LOSS_PENALTY * mean_loss / 100)
+        score = 100 * reliability * (SPEED_WEIGHT * speed_part + LATENCY_WEIGHT * latency_part +
+                                     STABILITY_WEIGHT * stability_part)
+        score[successes == 0] = 0
+
+        # Best score first; ties keep the order URLs were first seen in
+        order = np.argsort(-score, kind='stable')
+        self.rank = np.empty(groups, dtype=np.int64)
+        self.rank[order] = np.arange(1, groups + 1)
+        self.score = score
+        self.runs = runs
+        self.failed = failed
+        self.loss = mean_loss
+        self.ping = measured(ping_p[0])
+        self.ping_p95 = measured(ping_p[1])
+        self.jitter = measured(mean_jitter)
+        self.speed = measured(speed_p[0])
+        self.speed_p10 = measured(speed_p[1])
+        self.peak = peak_max
+        self.ttfb = measured(ttfb_p[0])
+        self.ttfb_p95 = measured(ttfb_p[1])
+        self.stability = measured(stability)
+
+        self.ping_band = np.where(self.ping >= 0, np.digitize(self.ping, PING_BANDS), UNRATED)
+        self.speed_band = np.where(self.speed > 0, 2 - np.digitize(self.speed, SPEED_BANDS, right=True), UNRATED)
+        self.score_band = 2 - np.digitize(score, SCORE_BANDS)
+
+    def row(self, row):
+        return RankedResult(int(self.rank[row]), self.urls[row], round(float(self.score[row]), 2),
+                            int(self.runs[row]), float(self.failed[row]), float(self.loss[row]),
+                            float(self.ping[row]), float(self.ping_p95[row]), float(self.jitter[row]),
+                            float(self.speed[row]), float(self.speed_p10[row]), float(self.peak[row]),
+                            float(self.ttfb[row]), float(self.ttfb_p95[row]), float(self.stability[row]))
@@ -0,0 +1,65 @@
+# ---------------- BDIX Throughput Meter ----------------
+# Collects bytes from one or more parallel streams into fixed time buckets.
+# The first RAMP_UP seconds after the first byte are left out so TCP slow
+# start does not drag the numbers down; the sustained rate covers the rest of
+# the window and the peak is the best single bucket.
+import math
+import time
+import threading
+
+class ThroughputMeter:
+    def __init__(self, start_time, ramp_up, window, interval):
+        self.start_time = start_time
+        self.ramp_up = max(0, ramp_up)
+        self.window = max(0, window)
+        self.interval = interval
+        self.first_byte_time = None
+        self.first_chunk_size = 0
+        self.last_byte_time = None
+        self.total_bytes = 0
+        self.buckets = []  # bytes received per interval since the first byte
+        self._lock = threading.Lock()
+
+    def add(self, size):
+        now = time.perf_counter()
+        with self._lock:
+            if self.first_byte_time is None:
+                self.first_byte_time = now
+                self.first_chunk_size = size
+            index = int((now - self.first_byte_time) / self.interval)
+            if index >= len(self.buckets):
+                self.buckets.extend([0] * (index + 1 - len(self.buckets)))
+            self.buckets[index] += size
+            self.total_bytes += size
+            self.last_byte_time = now
+
+    def done(self):
+        return (self.first_byte_time is not None and
+                time.perf_counter() >= self.first_byte_time + self.ramp_up + self.window)
+
+    def result(self):
+        # (sustained Mbps, peak Mbps, ttfb ms); None when no byte arrived
+        if self.first_byte_time is None:
+            return None
+        ttfb = (self.first_byte_time - self.start_time) * 1000
+        end_time = self.last_byte_time
+        elapsed = end_time - self.first_byte_time
+
+        ramp_buckets = math.ceil(self.ramp_up / self.interval)
+        measured = self.buckets[ramp_buckets:]
+        measured_time = elapsed - ramp_buckets * self.interval
+        if measured and measured_time >= self.interval:
+            sustained = sum(measured) * 8 / (measured_time * 1_000_000)
+        else:
+            # Transfer ended during ramp-up, so use everything after the first chunk
+            steady_bytes = self.total_bytes - self.first_chunk_size
+            if steady_bytes <= 0:
+                steady_bytes = self.total_bytes
+                elapsed = end_time - self.start_time
+            sustained = steady_bytes * 8 / (max(elapsed, 0.001) * 1_000_000)
+
+        # Only buckets that were fully inside the transfer count towards the peak
+        complete = int(elapsed / self.interval)
+        candidates = self.buckets[ramp_buckets:complete]
+        peak = max(candidates) * 8 / (self.interval * 1_000_000) if candidates else sustained
+        return sustained, max(peak, sustained), ttfb